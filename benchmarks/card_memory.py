@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+import gc
+import json
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# also when run as a script instead of with "python -m benchmarks.card_memory"
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from fftcgtool.card import Card
+from fftcgtool.language import API_LANGS
+from fftcgtool.utils import GRID
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "get-cards.json")
+
+
+def _load_cards(path: str, copies: int) -> dict:
+    with open(path, "r") as file:
+        response = file.read()
+
+    # repeat the fixture across opuses to get a realistic DB size
+    cards = {}
+    for copy in range(copies):
+        # separate strings for every copy, as with separate API responses
+        for card_data in json.loads(response)["cards"]:
+            opus, rest = card_data["Code"].split("-", 1)
+            if opus.isnumeric():
+                opus = str(int(opus) + copy)
+
+            card = Card.from_square_api_data({**card_data, "Code": f"{opus}-{rest}"})
+            cards[card.code] = card
+
+    # faces as assigned by Book
+    for language in API_LANGS:
+        for i, card in enumerate(cards.values()):
+            face = f"opus_{card.code.opus}_{language.short}_{i // GRID.capacity}.jpg"
+            card.set_face(language, face)
+
+    return cards
+
+
+def _measure(action):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = action()
+    duration = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, size, duration
+
+
+@click.command()
+@click.option("--fixture", type=click.Path(exists=True, dir_okay=False), default=FIXTURE,
+              help="get-cards API response to use")
+@click.option("--copies", type=int, default=20, help="number of times the fixture is repeated")
+@click.option("--repeat", type=int, default=5, help="number of timed unpickling runs")
+def main(fixture: str, copies: int, repeat: int) -> None:
+    """Measures memory use and unpickling time of a card DB."""
+
+    start = time.perf_counter()
+    cards = _load_cards(fixture, copies)
+    click.echo(f"built {len(cards)} cards in {time.perf_counter() - start:.3f}s")
+
+    pickled = pickle.dumps(cards)
+    click.echo(f"pickle size:    {len(pickled) / 1024:10.1f} KiB")
+
+    # memory held by a freshly unpickled DB
+    del cards
+    cards, size, _ = _measure(lambda: pickle.loads(pickled))
+    click.echo(f"memory:         {size / 1024:10.1f} KiB")
+
+    # unpickling time, best of several runs
+    del cards
+    durations = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        pickle.loads(pickled)
+        durations.append(time.perf_counter() - start)
+
+    click.echo(f"unpickle:       {min(durations) * 1000:10.1f} ms")
+
+    # accessing every language of every card
+    cards = pickle.loads(pickled)
+    start = time.perf_counter()
+    for card in cards.values():
+        for language in API_LANGS:
+            card[language].text
+
+    click.echo(f"read all texts: {(time.perf_counter() - start) * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
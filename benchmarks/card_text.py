@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+import json
+import os
+import random
+import re
+import sys
+import time
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# also when run as a script instead of with "python -m benchmarks.card_text"
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from fftcgtool.card import _ELEMENTS_JAP, _normalize_card_text, _normalize_text, _normalize_text_stepwise, \
+    _sub_elements, _sub_encircle, _Unsupported
+from fftcgtool.language import API_LANGS
+from fftcgtool.utils import encircle_symbol
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "get-cards.json")
+
+# building blocks for randomized card texts
+_PIECES = [
+    "Cloud", "the", "Forward", ":", ".", "1", "Damage", "EX BURST", "ex burst",
+    " ", "  ", "\n", "　", "\xa0", "\t",
+    "《S》", "《s》", "《C》", "《c》", "《1》", "《0》", "《x》", "《火》", "《闇》", "《ダル》", "《X1》", "《", "》",
+    "[[br]]", "[[BR]]", " [[br]] ",
+    "[[ex]]EX BURST[[/]]", "[[ex]] EX BURST [[/]] ", "[[EX]]ex burst[[/]]", "[[ex]]EXバースト [[/]]",
+    "[[i]]Damage 5 -- [[/]]", "[[i]]Schaden 3--[[/]] ", "[[I]]DÉGÂTS 10 -- [[/]]",
+    "[[s]]Haste[[/]]", "[[s]] Haste [[/]] ", "[[b]] [[/]]", "[[s]][[/]]", "[[i]]《1》 text 《火》[[/]]",
+    "[[s]]a《ダル》b[[/]]", "[[s]]EX BURST[[/]]", "[[s]]a[[br]]b[[/]]", "[[xy]]", "[", "]", "[[/]]",
+]
+
+
+def _fixture_texts(path: str) -> list[str]:
+    with open(path, "r") as file:
+        cards = json.load(file)["cards"]
+
+    return [
+        str(card[f"Text{language.key_suffix}"])
+        for card in cards
+        for language in API_LANGS
+    ]
+
+
+def _original(text: str) -> str:
+    # _load_text before the normalizer was split off, verbatim
+    # place "S" symbols
+    text = text.replace("《S》", encircle_symbol("S", False))
+    # place elemental cost symbols
+    text = re.sub(rf"《([{''.join(_ELEMENTS_JAP)}])》", _sub_elements, text, flags=re.UNICODE)
+    # place crystal symbols
+    text = text.replace("《C》", "♦")
+    # place dull symbols
+    text = text.replace("《ダル》", "[⤵]")
+    # relocate misplaced line break markers
+    text = re.sub(r"(\[\[[a-z]+]][^\[]*?)(\[\[br]])([^\[]*?\[\[/]])", r"\2\1\3", text,
+                  flags=re.IGNORECASE | re.UNICODE)
+    # place EX-BURST markers
+    text = re.sub(r"\[\[ex]]\s*EX BURST\s*\[\[/]]\s*", r"[EX BURST] ", text,
+                  flags=re.IGNORECASE | re.UNICODE)
+    # also place unmarked EX-BURST markers
+    text = re.sub(r"([^\[]|^)(EX BURST)\s*([^]]|$)", r"\1[\2] \3", text, flags=re.UNICODE)
+    # replace Damage hints with brackets and en-dash
+    text = re.sub(r"\[\[i]](Schaden|Damage|Daños|Dégâts|Danni)\s*([0-9]+)\s*--\s*\[\[/]]\s*", r"[\1 \2] – ",
+                  text, flags=re.IGNORECASE | re.UNICODE)
+    # place other letter and numerical cost symbols
+    text = re.sub(r"《([a-z0-9])》", _sub_encircle, text, flags=re.IGNORECASE | re.UNICODE)
+    # remove empty formatting hints
+    text = re.sub(r"\[\[[a-z]]]\s*\[\[/]]\s*", r" ", text, flags=re.IGNORECASE | re.UNICODE)
+    # replace formatting hints with brackets
+    text = re.sub(r"\[\[[a-z]]]([^\[]*?)\s*\[\[/]]\s*", r"[\1] ", text, flags=re.IGNORECASE | re.UNICODE)
+    # relocate misplaced spaces at start of bracketed string
+    text = re.sub(r"\s*(\[)\s+([^]]*?])", r" \1\2", text, flags=re.IGNORECASE | re.UNICODE)
+    # relocate misplaced spaces at end of bracketed string
+    text = re.sub(r"(\[[^]]*?)\s+(])\s*", r"\1\2 ", text, flags=re.IGNORECASE | re.UNICODE)
+    # place line breaks
+    return re.sub(r"\s*\[\[br]]\s*", "\n\n", text, flags=re.IGNORECASE | re.UNICODE)
+
+
+def _throughput(normalize, texts: list[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            normalize(text)
+
+    return len(texts) * repeat / (time.perf_counter() - start)
+
+
+def _fast_path(text: str) -> bool:
+    try:
+        _normalize_text(text)
+        return True
+    except _Unsupported:
+        return False
+
+
+@click.command()
+@click.option("--fixture", type=click.Path(exists=True, dir_okay=False), default=FIXTURE,
+              help="get-cards API response to use")
+@click.option("--repeat", type=int, default=50, help="passes over the fixture texts")
+@click.option("--fuzz", type=int, default=100000, help="number of randomized texts to compare")
+@click.option("--seed", type=int, default=0, help="seed for randomized texts")
+def main(fixture: str, repeat: int, fuzz: int, seed: int) -> None:
+    """Checks the card text normalizers against the original implementation and measures them."""
+
+    texts = _fixture_texts(fixture)
+
+    # identical output on the fixture
+    fast_texts = [text for text in texts if _fast_path(text)]
+    mismatches = [
+        text
+        for text in texts
+        if not _normalize_card_text(text) == _normalize_text_stepwise(text) == _original(text)
+    ]
+    fallbacks = len(texts) - len(fast_texts)
+    click.echo(f"fixture: {len(texts)} texts, {len(mismatches)} mismatches, {fallbacks} stepwise fallbacks")
+
+    # identical output on randomized markup
+    rng = random.Random(seed)
+    fuzz_mismatches = 0
+    for _ in range(fuzz):
+        text = "".join(rng.choice(_PIECES) for _ in range(rng.randint(0, 12)))
+        if not _normalize_card_text(text) == _normalize_text_stepwise(text) == _original(text):
+            fuzz_mismatches += 1
+            click.echo(f"mismatch: {text!r}")
+
+    click.echo(f"randomized: {fuzz} texts, {fuzz_mismatches} mismatches")
+
+    # throughput
+    original = _throughput(_original, texts, repeat)
+    stepwise = _throughput(_normalize_text_stepwise, texts, repeat)
+    single_pass = _throughput(_normalize_text, texts, repeat)
+    click.echo(f"original:    {original:10.0f} texts/s")
+    click.echo(f"stepwise:    {stepwise:10.0f} texts/s ({stepwise / original:.2f}x)")
+    click.echo(f"single pass: {single_pass:10.0f} texts/s ({single_pass / original:.2f}x)")
+
+    if mismatches or fuzz_mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
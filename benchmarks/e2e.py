@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+import click
+import roman
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# also when run as a script instead of with "python -m benchmarks.e2e"
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from fftcgtool.utils import RESOLUTION
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "get-cards.json")
+
+# set names used by the Square API for opuses past XIV
+_SET_NUMBERS = {
+    "Crystal Dominion": 15,
+    "Emissaries of Light": 16,
+    "Rebellion's Call": 17,
+}
+# number of distinct synthetic card images
+_IMAGE_VARIANTS = 8
+
+
+class _Stats:
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.errors = 0
+        self.missing = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.requests = self.bytes = self.errors = self.missing = self.not_modified = 0
+
+
+class _StandIn(ThreadingHTTPServer):
+    # local stand-in for the Square API, the card CDN and ffdecks.com
+    daemon_threads = True
+
+    def __init__(self, fixture: dict, latency: float, error_rate: float, missing_rate: float, seed: int):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.fixture = fixture
+        self.latency = latency
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.stats = _Stats()
+        self.deck_codes: list[dict] = []
+        self.__rng = random.Random(seed)
+        self.__rng_lock = threading.Lock()
+
+        # card faces are served at twice the page resolution, like the CDN does
+        size = RESOLUTION.x * 2, RESOLUTION.y * 2
+        self.images = [_synthetic_jpeg(size, variant) for variant in range(_IMAGE_VARIANTS + 1)]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def roll(self, rate: float) -> bool:
+        with self.__rng_lock:
+            return self.__rng.random() < rate
+
+
+def _image_variant(code: str, suffix: str) -> int:
+    variant = zlib.crc32(code.encode()) % _IMAGE_VARIANTS
+    if suffix == "eg":
+        return variant
+
+    # localized images always differ from the english one
+    return (variant + 1 + zlib.crc32(suffix.encode()) % (_IMAGE_VARIANTS - 1)) % _IMAGE_VARIANTS
+
+
+def _synthetic_jpeg(size: tuple[int, int], variant: int) -> bytes:
+    # tinted noise, so the JPEGs have a realistic size
+    noise = Image.effect_noise(size, 16).convert("RGB")
+    tint = Image.new("RGB", size, (40 * variant % 256, 90 * variant % 256, 150 * variant % 256))
+    image = Image.blend(noise, tint, 0.5)
+
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _StandIn
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def __send(self, status: int, body: bytes = b"", headers: Optional[dict[str, str]] = None) -> None:
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        with self.server.stats.lock:
+            self.server.stats.requests += 1
+            self.server.stats.bytes += len(body)
+
+    def __send_json(self, data) -> None:
+        self.__send(200, json.dumps(data).encode("utf-8"), {"Content-Type": "application/json"})
+
+    def __injected_error(self) -> bool:
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+
+        if not self.server.roll(self.server.error_rate):
+            return False
+
+        with self.server.stats.lock:
+            self.server.stats.errors += 1
+
+        self.__send(503)
+        return True
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+
+        if self.__injected_error():
+            return
+
+        if url.path == "/back.jpg":
+            self.__send_image(self.server.images[-1])
+
+        elif url.path.startswith("/cdn/"):
+            code, suffix = url.path[len("/cdn/"):-len(".jpg")].rsplit("_", 1)
+
+            # localized images missing on the CDN, always the same ones
+            if suffix != "eg" and zlib.crc32(url.path.encode()) / 2 ** 32 < self.server.missing_rate:
+                with self.server.stats.lock:
+                    self.server.stats.missing += 1
+
+                self.__send(404)
+
+            else:
+                self.__send_image(self.server.images[_image_variant(code, suffix)])
+
+        elif url.path == "/api/deck":
+            self.__send_deck(parse_qs(url.query).get("deck_id", [""])[0])
+
+        else:
+            self.__send(404)
+
+    def __send_image(self, content: bytes) -> None:
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+
+        if self.headers.get("If-None-Match") == etag:
+            with self.server.stats.lock:
+                self.server.stats.not_modified += 1
+
+            self.__send(304, headers={"ETag": etag})
+
+        else:
+            self.__send(200, content, {"Content-Type": "image/jpeg", "ETag": etag})
+
+    def __send_deck(self, deck_id: str) -> None:
+        if not deck_id.isnumeric() or not self.server.deck_codes:
+            self.__send(404)
+            return
+
+        # a reproducible deck of 50 cards per ID
+        rng = random.Random(int(deck_id))
+        cards, count = [], 0
+        while count < 50:
+            card = rng.choice(self.server.deck_codes)
+            quantity = min(rng.randint(1, 3), 50 - count)
+            cards.append({"card": card, "quantity": str(quantity)})
+            count += quantity
+
+        self.__send_json({"name": f"Benchmark Deck {deck_id}", "cards": cards})
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        if self.__injected_error():
+            return
+
+        if urlsplit(self.path).path != "/get-cards":
+            self.__send(404)
+            return
+
+        params = json.loads(body or b"{}")
+        set_name = (params.get("set") or [""])[0]
+
+        # recorded opus, renumbered as the requested one
+        if set_name.startswith("Opus "):
+            number = roman.fromRoman(set_name[len("Opus "):])
+        elif set_name in _SET_NUMBERS:
+            number = _SET_NUMBERS[set_name]
+        else:
+            self.__send_json({"count": 0, "cards": []})
+            return
+
+        cards = [
+            {**card, "Code": f"{number}-{card['Code'].split('-', 1)[1]}"}
+            if card["Code"].split("-", 1)[0].isnumeric()
+            else card
+            for card in self.server.fixture["cards"]
+        ]
+        self.__send_json({"count": len(cards), "cards": cards})
+
+
+def _run(args: list[str], env: dict[str, str], work_dir: str) -> tuple[int, float, int]:
+    # exit code, wall time and peak RSS in bytes of one fftcgtool run
+    answers_path = os.path.join(work_dir, "answers.txt")
+    if not os.path.exists(answers_path):
+        # page URLs for the upload prompt, one per question
+        with open(answers_path, "w") as answers:
+            answers.writelines(f"https://example.com/pages/{i}.jpg\n" for i in range(100000))
+
+    start = time.perf_counter()
+    with open(answers_path, "r") as answers, open(os.path.join(work_dir, "fftcgtool.log"), "a") as log:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "fftcgtool.scripts.fftcgtool", *args],
+            env=env, stdin=answers, stdout=subprocess.DEVNULL, stderr=log,
+        )
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+    wall = time.perf_counter() - start
+    # kilobytes on Linux, bytes on macOS
+    peak_rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return proc.returncode, wall, peak_rss
+
+
+@click.command()
+@click.option("--fixture", type=click.Path(exists=True, dir_okay=False), default=FIXTURE,
+              help="get-cards API response to serve for every opus")
+@click.option("--opus", "opus_ids", type=click.IntRange(min=1, max=17), multiple=True, default=[15, 16, 17],
+              help="opus to import, may be repeated")
+@click.option("-L", "--language", "languages", multiple=True, default=["en"],
+              help="language to import, may be repeated")
+@click.option("-n", "--num-requests", type=click.IntRange(min=1), default=20,
+              help="number of concurrent requests")
+@click.option("-j", "--jobs", type=click.IntRange(min=1), default=1, help="number of opuses imported in parallel")
+@click.option("--decks", type=click.IntRange(min=0), default=50, help="number of ffdecks decks to import")
+@click.option("--latency", type=click.FloatRange(min=0), default=0, help="added latency per request in ms")
+@click.option("--error-rate", type=click.FloatRange(min=0, max=1), default=0,
+              help="fraction of requests answered with 503")
+@click.option("--missing-rate", type=click.FloatRange(min=0, max=1), default=0,
+              help="fraction of localized card images missing on the CDN")
+@click.option("--retry-budget", type=click.IntRange(min=0), default=1000, help="retries per fftcgtool run")
+@click.option("--seed", type=int, default=0, help="seed for error injection")
+@click.option("--keep", is_flag=True, help="keep the output directory")
+def main(fixture: str, opus_ids: list[int], languages: list[str], num_requests: int, jobs: int, decks: int,
+         latency: float, error_rate: float, missing_rate: float, retry_budget: int, seed: int, keep: bool) -> None:
+    """Runs fftcgtool end to end against a local stand-in for the Square API, the card CDN and ffdecks.com."""
+
+    with open(fixture, "r") as file:
+        fixture_data = json.load(file)
+
+    server = _StandIn(fixture_data, latency / 1000, error_rate, missing_rate, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # cards available for decks
+    server.deck_codes = [
+        {
+            "serial_number": f"{opus_id}-{card['Code'].split('-', 1)[1]}",
+            "type": card["Type_EN"],
+            "cost": card["Cost"],
+        }
+        for opus_id in opus_ids
+        for card in fixture_data["cards"]
+        if card["Code"].split("-", 1)[0].isnumeric()
+    ]
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+        "FFTCGTOOL_CARD_BACK_URL": f"{server.base_url}/back.jpg",
+        "FFTCGTOOL_CARD_FACE_URL": f"{server.base_url}/cdn/{{}}_{{}}.jpg",
+        "FFTCGTOOL_SQUARE_API_URL": f"{server.base_url}/get-cards",
+        "FFTCGTOOL_FFDECKS_API_URL": f"{server.base_url}/api/deck",
+    }
+
+    work_dir = tempfile.mkdtemp(prefix="fftcgtool-bench-")
+    log_path = os.path.join(work_dir, "fftcgtool.log")
+    main_args = ["-v", "-o", os.path.join(work_dir, "out"), "--retry-budget", str(retry_budget)]
+    opus_args = ["opuses", "-n", str(num_requests), "-j", str(jobs)]
+    for language in languages:
+        opus_args += ["-L", language]
+    opus_args += [str(opus_id) for opus_id in opus_ids]
+
+    num_cards = len(fixture_data["cards"]) * len(opus_ids) * len(languages)
+    runs = [
+        ("opuses (cold)", main_args + opus_args, num_cards),
+        ("opuses (warm)", main_args + opus_args, num_cards),
+        ("ffdecks", main_args + ["ffdecks", "-n", str(num_requests), "--rate-limit", "0"] +
+         [str(deck_id) for deck_id in range(1, decks + 1)], 50 * decks),
+    ]
+
+    click.echo(f"stand-in at {server.base_url}, output in {work_dir}")
+    click.echo(f"{'run':<15} {'exit':>4} {'wall s':>8} {'cards/s':>9} {'peak RSS MiB':>12} "
+               f"{'requests':>8} {'MiB sent':>8} {'503':>5} {'404':>5} {'304':>5}")
+
+    failed = False
+    try:
+        for name, args, cards in runs:
+            server.stats.reset()
+            code, wall, peak_rss = _run(args, env, work_dir)
+            failed |= code != 0
+
+            stats = server.stats
+            click.echo(f"{name:<15} {code:>4} {wall:>8.2f} {cards / wall:>9.1f} {peak_rss / 2 ** 20:>12.1f} "
+                       f"{stats.requests:>8} {stats.bytes / 2 ** 20:>8.1f} {stats.errors:>5} {stats.missing:>5} "
+                       f"{stats.not_modified:>5}")
+
+    finally:
+        server.shutdown()
+        if failed:
+            click.echo(f"fftcgtool failed, see {log_path}", err=True)
+        elif not keep:
+            shutil.rmtree(work_dir)
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+
+import click
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# also when run as a script instead of with "python -m benchmarks.page_assembly"
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from fftcgtool.grid import Grid
+from fftcgtool.utils import GRID, RESOLUTION, grid_paste
+
+try:
+    import numpy
+except ImportError:
+    # optional, only for comparison
+    numpy = None
+
+
+def _tiles(grid: Grid, resolution: Grid) -> list[Image.Image]:
+    # distinct card images, as they come out of the image loader
+    return [
+        Image.new("RGB", resolution, (i * 37 % 256, i * 91 % 256, i * 13 % 256))
+        for i in range(grid.capacity + 1)
+    ]
+
+
+def _fresh_pages(grid: Grid, resolution: Grid, tiles: list[Image.Image]):
+    def assemble() -> Image.Image:
+        page = Image.new("RGB", grid * resolution)
+        for i, tile in enumerate(tiles):
+            grid_paste(page, i, tile, grid)
+
+        return page
+
+    return assemble
+
+
+def _reused_page(grid: Grid, resolution: Grid, tiles: list[Image.Image]):
+    page = Image.new("RGB", grid * resolution)
+
+    def assemble() -> Image.Image:
+        for i, tile in enumerate(tiles):
+            grid_paste(page, i, tile, grid)
+
+        return page
+
+    return assemble
+
+
+def _numpy_pages(grid: Grid, resolution: Grid, tiles: list[Image.Image]):
+    def assemble() -> Image.Image:
+        # (rows, cols, h, w, 3) -> (rows * h, cols * w, 3)
+        cells = numpy.stack([numpy.asarray(tile) for tile in tiles[:grid.capacity]]
+                            + [numpy.zeros((resolution.y, resolution.x, 3), numpy.uint8)] * (
+                                    grid.x * grid.y - grid.capacity))
+        cells = cells.reshape(grid.y, grid.x, resolution.y, resolution.x, 3)
+        page = Image.fromarray(cells.transpose(0, 2, 1, 3, 4).reshape(grid.y * resolution.y, grid.x * resolution.x, 3))
+        grid_paste(page, grid.capacity, tiles[grid.capacity], grid)
+
+        return page
+
+    return assemble
+
+
+@click.command()
+@click.option("--grid", type=(int, int), default=tuple(GRID), help="cards per row and column")
+@click.option("--card-size", type=(int, int), default=tuple(RESOLUTION), help="card image size in pixels")
+@click.option("--pages", type=int, default=20, help="number of pages per approach")
+def main(grid: tuple[int, int], card_size: tuple[int, int], pages: int) -> None:
+    """Compares ways of composing book pages from card images."""
+
+    grid, resolution = Grid(grid), Grid(card_size)
+    tiles = _tiles(grid, resolution)
+
+    approaches = {
+        "fresh page": _fresh_pages,
+        "reused page": _reused_page,
+    }
+    if numpy is not None:
+        approaches["numpy"] = _numpy_pages
+
+    click.echo(f"{pages} pages of {grid.x}x{grid.y} cards at {resolution.x}x{resolution.y}")
+
+    for name, approach in approaches.items():
+        assemble = approach(grid, resolution, tiles)
+        # warm up
+        assemble()
+
+        start, cpu_start = time.perf_counter(), time.process_time()
+        for _ in range(pages):
+            assemble()
+
+        duration, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+        click.echo(f"{name + ':':15s} {duration / pages * 1000:8.1f} ms/page, {cpu / pages * 1000:8.1f} ms CPU/page")
+
+
+if __name__ == "__main__":
+    main()
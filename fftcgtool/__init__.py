@@ -1,8 +1,17 @@
 from .book import Book
 from .carddb import CardDB, RWCardDB
+from .checkpoint import Checkpoint
+from .deckwriter import DeckWriter
 from .ffdecks import FFDecks
+from .fetcher import Fetcher, FetchError
+from .imagecache import ImageCache
 from .language import Language
+from .metrics import Metrics
 from .opus import Opus
+from .pageformat import PageFormat
+from .pageregistry import PageRegistry
+from .responsecache import ResponseCache
+from .tilestore import TileStore
 from .ttsdeck import TTSDeck
 
-__all__ = ["Book", "CardDB", "RWCardDB", "FFDecks", "Language", "Opus", "TTSDeck"]
+__all__ = ["Book", "CardDB", "RWCardDB", "Checkpoint", "DeckWriter", "FFDecks", "Fetcher", "FetchError", "ImageCache", "Language", "Metrics", "Opus", "PageFormat", "PageRegistry", "ResponseCache", "TileStore", "TTSDeck"]
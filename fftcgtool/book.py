@@ -1,68 +1,290 @@
+import collections
+import contextlib
 import dataclasses
+import itertools
+import json
 import logging
 import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Iterator, Optional
 
 from PIL import Image
 
+from .card import Card
 from .cards import Cards
+from .code import Code
+from .grid import Grid
 from .imageloader import ImageLoader
 from .language import Language
-from .utils import GRID, RESOLUTION, CARD_BACK_URL, IMAGES_DIR_NAME, chunks, grid_paste
+from .metrics import Metrics
+from .pageformat import PageFormat
+from .pageregistry import PageRegistry
+from .utils import GRID, RESOLUTION, CARD_BACK_URL, CARD_FACE_URL, IMAGES_DIR_NAME, chunks, grid_paste, \
+    tier_file_name
 
 
 class Book:
-    def __init__(self, cards: Cards, language: Language, num_threads: int):
-        logger = logging.getLogger(__name__)
-
-        # all card face URLs
-        urls = [
-            ("https://fftcg.cdn.sewest.net/images/cards/full/{}_{}.jpg", card.code.long, language.image_suffix)
-            for card in cards
-        ]
-        # card back URL
-        urls.insert(0, (CARD_BACK_URL, "", ""))
-
-        # multi-threaded download
-        images = iter(ImageLoader.load(urls, num_threads))
-        # card back Image
-        back_image = next(images)
+    def __init__(self, cards: Cards, language: Language, num_threads: int, max_memory: int = 0,
+                 page_format: PageFormat = PageFormat(), num_encoders: int = 1, incremental: bool = True,
+                 downloads: Optional[Executor] = None, registry: Optional[PageRegistry] = None,
+                 assign_faces: bool = True, grid: Grid = GRID, resolution: Grid = RESOLUTION,
+                 tiers: Optional[dict[str, float]] = None):
+        self.__language = language
+        self.__num_threads = num_threads
+        self.__downloads = downloads
+        self.__registry = registry
+        self.__page_format = page_format
+        self.__incremental = incremental
+        self.__assign_faces = assign_faces
+        # decoded card images are kept for books of their own cards
+        self.__tile_group = cards.file_name if assign_faces else None
+        self.__grid = grid
+        self.__resolution = resolution
+        # additional pages, scaled down: tier name -> scale
+        self.__tiers = tiers or {}
+        # card code -> (page file name, index on page)
+        self.__layout: dict[Code, tuple[str, int]] = {}
+        # pages being composed or encoded count towards the memory ceiling, leaving at least half for card images
+        page_size = grid * resolution
+        page_bytes = page_size.x * page_size.y * 3
+        encoder_bytes = page_bytes + round(page_bytes * sum(scale * scale for scale in self.__tiers.values()))
+        self.__num_encoders = max(1, min(num_encoders, (max_memory // 2 - page_bytes) // encoder_bytes))
+        # number of downloaded card images fitting into the rest
+        pages_bytes = page_bytes + self.__num_encoders * encoder_bytes
+        self.__max_in_flight = max(0, max_memory - pages_bytes) // (resolution.x * resolution.y * 3)
 
         self.__pages = []
+        self.__rebuilt_faces = []
 
-        for page_num, (page_images, page_cards) in enumerate(zip(
-                chunks(GRID.capacity, images), chunks(GRID.capacity, cards)
-        )):
-            file_name = f"{cards.file_name}_{page_num}.jpg"
-
-            # create book page Image
-            page_image = Image.new("RGB", GRID * RESOLUTION)
-            logger.info(f"New image: {page_image.size[0]}x{page_image.size[1]}")
-
-            # paste card faces onto page
-            for i, image in enumerate(page_images):
-                grid_paste(page_image, i, image)
-
-            # paste card back in last position
-            grid_paste(page_image, GRID.capacity, back_image)
+        for page_num, page_cards in enumerate(chunks(grid.capacity, cards)):
+            file_name = f"{cards.file_name}_{page_num}.{page_format.extension}"
+            page_cards = list(page_cards)
 
             # set card indices
             for i, card in enumerate(page_cards):
-                card.index = i
-                card[language] = dataclasses.replace(card[language], face=file_name)
+                self.__place(card, file_name, i)
 
-            # save page
             self.__pages.append({
                 "file_name": file_name,
-                "image": page_image,
                 "cards": page_cards,
+                "codes": [card.code.long for card in page_cards],
+                # card face URLs
+                "urls": [
+                    (CARD_FACE_URL, card.code.long, language.image_suffix)
+                    for card in page_cards
+                ],
             })
 
+    def __place(self, card: Card, file_name: str, index: int) -> None:
+        self.__layout[card.code] = file_name, index
+
+        # otherwise, cards stay as they are (e.g. CardDB cards on pages of their own)
+        if self.__assign_faces:
+            card.index = index
+            card.set_face(self.__language, file_name)
+
+    @property
+    def layout(self) -> dict[Code, tuple[str, int]]:
+        # where the cards are
+        return self.__layout
+
+    @property
+    def rebuilt_faces(self) -> list[str]:
+        # pages actually written by the last save
+        return self.__rebuilt_faces
+
+    @staticmethod
+    def __manifest_path(page: dict[str, Any]) -> str:
+        return os.path.join(IMAGES_DIR_NAME, f"{page['file_name']}.json")
+
+    def __manifest(self, page: dict[str, Any], back: str, sources: list[str]) -> dict[str, Any]:
+        # everything a page's content depends on
+        return {
+            "codes": page["codes"],
+            "language": self.__language.short,
+            "format": dataclasses.asdict(self.__page_format),
+            "grid": list(self.__grid),
+            "resolution": list(self.__resolution),
+            "tiers": self.__tiers,
+            "back": back,
+            "sources": sources,
+        }
+
+    def __page_files(self, page: dict[str, Any]) -> list[str]:
+        # full page and all tiers
+        return [page["file_name"]] + [
+            tier_file_name(page["file_name"], tier)
+            for tier in self.__tiers
+        ]
+
+    def __is_unchanged(self, page: dict[str, Any], manifest: dict[str, Any]) -> bool:
+        if not all(os.path.exists(os.path.join(IMAGES_DIR_NAME, file_name)) for file_name in self.__page_files(page)):
+            return False
+
+        try:
+            with open(Book.__manifest_path(page), "r") as file:
+                old_manifest = json.load(file)
+
+        except (FileNotFoundError, ValueError):
+            return False
+
+        return manifest == old_manifest
+
+    def __share_page(self, page: dict[str, Any], manifest: dict[str, Any]) -> bool:
+        logger = logging.getLogger(__name__)
+
+        if self.__registry is None or (file_name := self.__registry.find(manifest)) is None:
+            return False
+
+        # same content already on another page, e.g. english images in all languages
+        if file_name != page["file_name"]:
+            logger.info(f"Sharing {file_name!r} instead of building {page['file_name']!r}")
+
+            for card in page["cards"]:
+                self.__place(card, file_name, self.__layout[card.code][1])
+
+        return True
+
+    def __save_page(self, page_image: Image.Image, page: dict[str, Any], manifest: dict[str, Any]) -> None:
+        with Metrics().stage("book.encode"):
+            page_image.save(
+                os.path.join(IMAGES_DIR_NAME, page["file_name"]),
+                **self.__page_format.save_params,
+            )
+
+            # scaled down from the full page, no need to load the card images again
+            for tier, scale in self.__tiers.items():
+                tier_size = max(1, round(page_image.width * scale)), max(1, round(page_image.height * scale))
+                page_image.resize(tier_size, self.__page_format.resample_filter, reducing_gap=2.0).save(
+                    os.path.join(IMAGES_DIR_NAME, tier_file_name(page["file_name"], tier)),
+                    **self.__page_format.save_params,
+                )
+
+        # only record the manifest for completely written pages
+        with open(Book.__manifest_path(page), "w") as file:
+            json.dump(manifest, file, indent=2)
+
+        if self.__registry is not None:
+            self.__registry.register(manifest, page["file_name"])
+
+    def __rebuild_sources(self, rebuild: collections.deque,
+                          executor: Executor) -> Iterator[tuple[bytes, str]]:
+        # decide page by page, so composing starts before all sources are checked
+        back_fetching = ImageLoader.prefetch([(CARD_BACK_URL, "", "")], executor)
+        fetching = ImageLoader.prefetch(self.__pages[0]["urls"], executor) if self.__pages else []
+
+        try:
+            # current source images, changed ones are downloaded again
+            back_source, = [future.result() for future in back_fetching]
+
+            for page_num, page in enumerate(self.__pages):
+                sources = [future.result() for future in fetching]
+                manifest = self.__manifest(page, back_source[1], [digest for _, digest in sources])
+
+                # skip pages whose inputs didn't change since the last save, or which are built already
+                if self.__incremental and self.__is_unchanged(page, manifest):
+                    if self.__registry is not None:
+                        self.__registry.register(manifest, page["file_name"])
+
+                elif not self.__share_page(page, manifest):
+                    # card back before the first card face
+                    if not self.__rebuilt_faces:
+                        yield back_source
+
+                    rebuild.append((page, manifest))
+                    self.__rebuilt_faces.extend(self.__page_files(page))
+                    yield from sources
+
+                # next page downloads while this one is composed
+                next_pages = self.__pages[page_num + 1:page_num + 2]
+                fetching = ImageLoader.prefetch(next_pages[0]["urls"], executor) if next_pages else []
+
+        finally:
+            # stopped early: don't download images no longer needed
+            for future in back_fetching + fetching:
+                future.cancel()
+
     def save(self) -> None:
-        if not os.path.exists(IMAGES_DIR_NAME):
-            os.mkdir(IMAGES_DIR_NAME)
+        logger = logging.getLogger(__name__)
+
+        # concurrent Books may create it as well
+        os.makedirs(IMAGES_DIR_NAME, exist_ok=True)
+
+        self.__rebuilt_faces = []
+        # pages to rebuild, in the order their card images arrive
+        rebuild = collections.deque()
 
-        # save images
-        for page in self.__pages:
-            page["image"].save(
-                os.path.join(IMAGES_DIR_NAME, page["file_name"])
+        with contextlib.ExitStack() as stack:
+            # source images are downloaded once, for both checking and loading pages
+            executor = self.__downloads
+            if executor is None:
+                executor = stack.enter_context(ThreadPoolExecutor(self.__num_threads))
+
+            sources = self.__rebuild_sources(rebuild, executor)
+            stack.callback(sources.close)
+
+            # multi-threaded decoding
+            images = ImageLoader.load(
+                sources, self.__num_threads, self.__max_in_flight, executor,
+                self.__page_format.resample_filter, self.__resolution, self.__tile_group,
             )
+            stack.callback(images.close)
+
+            # card back Image, if any page needs rebuilding
+            if (back_image := next(images, None)) is not None:
+                self.__compose(images, back_image, rebuild)
+
+        # a file per page and tier
+        rebuilt = len(self.__rebuilt_faces) // (len(self.__tiers) + 1)
+        logger.info(f"Rebuilt {rebuilt} of {len(self.__pages)} pages")
+        Metrics().add("book", pages=len(self.__pages), rebuilt=rebuilt)
+
+    def __compose(self, images: Iterator[Image.Image], back_image: Image.Image, rebuild: collections.deque) -> None:
+        logger = logging.getLogger(__name__)
+
+        # empty grid cells
+        blank_image = Image.new("RGB", self.__resolution)
+
+        with ThreadPoolExecutor(self.__num_encoders) as executor:
+            encoding = collections.deque()
+            # page Images done encoding, reused: allocating a fresh page costs more than filling it
+            free_pages = []
+
+            # compose and save each page as soon as its card images arrive, its first one starts a page
+            for first_image in images:
+                page, manifest = rebuild.popleft()
+
+                if free_pages:
+                    page_image = free_pages.pop()
+
+                else:
+                    # create book page Image
+                    page_image = Image.new("RGB", self.__grid * self.__resolution)
+                    logger.info(f"New image: {page_image.size[0]}x{page_image.size[1]}")
+
+                with Metrics().stage("book.paste"):
+                    # paste card faces onto page
+                    page_images = itertools.chain([first_image], itertools.islice(images, len(page["urls"]) - 1))
+                    for i, image in enumerate(page_images):
+                        grid_paste(page_image, i, image, self.__grid)
+
+                    # clear cells of a reused page
+                    for i in range(len(page["urls"]), self.__grid.capacity):
+                        grid_paste(page_image, i, blank_image, self.__grid)
+
+                    # paste card back in last position
+                    grid_paste(page_image, self.__grid.capacity, back_image, self.__grid)
+
+                # limit the number of pages held for encoding
+                if len(encoding) >= self.__num_encoders:
+                    done_image, future = encoding.popleft()
+                    future.result()
+                    free_pages.append(done_image)
+
+                # save page in the background
+                future = executor.submit(self.__save_page, page_image, page, manifest)
+                encoding.append((page_image, future))
+
+            # wait for remaining pages, raising encoding errors
+            while encoding:
+                encoding.popleft()[1].result()
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import dataclasses
 import re
+import sys
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Iterable, Optional
 
 from .code import Code
 from .language import Language, API_LANGS
@@ -11,10 +13,25 @@ from .utils import encircle_symbol
 
 @dataclass(frozen=True)
 class CardContent:
+    __slots__ = ("name", "text", "face")
+
     name: str
     text: str
     face: str
 
+    def __getstate__(self) -> tuple[str, str, str]:
+        return self.name, self.text, self.face
+
+    def __setstate__(self, state: tuple[str, str, str] | dict[str, str]) -> None:
+        if isinstance(state, dict):
+            # pickled before __slots__
+            state = state["name"], state["text"], state["face"]
+
+        name, text, face = state
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "text", text)
+        object.__setattr__(self, "face", face)
+
 
 _ELEMENTS_JAP = [
     "火", "氷", "風", "土", "雷", "水", "光", "闇",
@@ -30,6 +47,35 @@ _ELEMENTS_MAP = {
 }
 
 
+_RE_ELEMENTS = re.compile(rf"《([{''.join(_ELEMENTS_JAP)}])》", flags=re.UNICODE)
+_RE_MISPLACED_BR = re.compile(r"(\[\[[a-z]+]][^\[]*?)(\[\[br]])([^\[]*?\[\[/]])", flags=re.IGNORECASE | re.UNICODE)
+_RE_EX_BURST = re.compile(r"\[\[ex]]\s*EX BURST\s*\[\[/]]\s*", flags=re.IGNORECASE | re.UNICODE)
+_RE_UNMARKED_EX_BURST = re.compile(r"([^\[]|^)(EX BURST)\s*([^]]|$)", flags=re.UNICODE)
+_RE_DAMAGE = re.compile(r"\[\[i]](Schaden|Damage|Daños|Dégâts|Danni)\s*([0-9]+)\s*--\s*\[\[/]]\s*",
+                        flags=re.IGNORECASE | re.UNICODE)
+_RE_SYMBOL = re.compile(r"《([a-z0-9])》", flags=re.IGNORECASE | re.UNICODE)
+_RE_EMPTY_HINT = re.compile(r"\[\[[a-z]]]\s*\[\[/]]\s*", flags=re.IGNORECASE | re.UNICODE)
+_RE_HINT = re.compile(r"\[\[[a-z]]]([^\[]*?)\s*\[\[/]]\s*", flags=re.IGNORECASE | re.UNICODE)
+_RE_BRACKET_START = re.compile(r"\s*(\[)\s+([^]]*?])", flags=re.IGNORECASE | re.UNICODE)
+_RE_BRACKET_END = re.compile(r"(\[[^]]*?)\s+(])\s*", flags=re.IGNORECASE | re.UNICODE)
+_RE_BR = re.compile(r"\s*\[\[br]]\s*", flags=re.IGNORECASE | re.UNICODE)
+
+# all markup in one alternation, in order of precedence
+_RE_TOKEN = re.compile(
+    r"(?P<ex_burst>\[\[ex]]\s*EX BURST\s*\[\[/]]\s*)"
+    r"|\[\[i]](?P<damage>(?P<damage_type>Schaden|Damage|Daños|Dégâts|Danni)\s*(?P<damage_value>[0-9]+))\s*--\s*\[\[/]]\s*"
+    r"|\[\[[a-z]]](?P<hint>(?P<hint_text>[^\[]*?))\s*\[\[/]]\s*"
+    r"|(?P<br>\[\[br]])"
+    r"|(?P<ex_hint>\[\[ex]])"
+    r"|(?P<end_hint>\[\[/]])"
+    r"|(?P<burst>(?-i:EX BURST))\s*"
+    r"|《(?:(?P<symbol>[a-z0-9])|(?P<element>[" + "".join(_ELEMENTS_JAP) + r"])|(?P<dull>ダル))》"
+    r"|(?P<bracket>[\[\]])",
+    flags=re.IGNORECASE | re.UNICODE,
+)
+_RE_HINT_SYMBOL = re.compile(r"《(?:([a-z0-9])|([" + "".join(_ELEMENTS_JAP) + r"]))》", flags=re.IGNORECASE | re.UNICODE)
+
+
 def _sub_encircle(match: re.Match) -> str:
     return encircle_symbol(match.group(1), False)
 
@@ -38,6 +84,13 @@ def _sub_elements(match: re.Match) -> str:
     return encircle_symbol(_ELEMENTS_MAP[match.group(1)], False)
 
 
+def _sub_hint_symbol(match: re.Match) -> str:
+    if (symbol := match.group(1)) is not None:
+        return "♦" if symbol == "C" else encircle_symbol(symbol, False)
+    else:
+        return encircle_symbol(_ELEMENTS_MAP[match.group(2)], False)
+
+
 def _load_name(language: Language, data: dict[str, Any]) -> str:
     return data[f"Name{language.key_suffix}"]
 
@@ -46,49 +99,200 @@ def _load_type(language: Language, data: dict[str, Any]) -> str:
     return data[f"Type{language.key_suffix}"]
 
 
-def _load_text(language: Language, data: dict) -> str:
-    # load text
-    text = str(data[f"Text{language.key_suffix}"])
+def _normalize_text_stepwise(text: str) -> str:
     # place "S" symbols
     text = text.replace("《S》", encircle_symbol("S", False))
     # place elemental cost symbols
-    text = re.sub(rf"《([{''.join(_ELEMENTS_JAP)}])》", _sub_elements, text, flags=re.UNICODE)
+    text = _RE_ELEMENTS.sub(_sub_elements, text)
     # place crystal symbols
     text = text.replace("《C》", "♦")
     # place dull symbols
     text = text.replace("《ダル》", "[⤵]")
     # relocate misplaced line break markers
-    text = re.sub(r"(\[\[[a-z]+]][^\[]*?)(\[\[br]])([^\[]*?\[\[/]])", r"\2\1\3", text,
-                  flags=re.IGNORECASE | re.UNICODE)
+    text = _RE_MISPLACED_BR.sub(r"\2\1\3", text)
     # place EX-BURST markers
-    text = re.sub(r"\[\[ex]]\s*EX BURST\s*\[\[/]]\s*", r"[EX BURST] ", text,
-                  flags=re.IGNORECASE | re.UNICODE)
+    text = _RE_EX_BURST.sub(r"[EX BURST] ", text)
     # also place unmarked EX-BURST markers
-    text = re.sub(r"([^\[]|^)(EX BURST)\s*([^]]|$)", r"\1[\2] \3", text, flags=re.UNICODE)
+    text = _RE_UNMARKED_EX_BURST.sub(r"\1[\2] \3", text)
     # replace Damage hints with brackets and en-dash
-    text = re.sub(r"\[\[i]](Schaden|Damage|Daños|Dégâts|Danni)\s*([0-9]+)\s*--\s*\[\[/]]\s*", r"[\1 \2] – ",
-                  text, flags=re.IGNORECASE | re.UNICODE)
+    text = _RE_DAMAGE.sub(r"[\1 \2] – ", text)
     # place other letter and numerical cost symbols
-    text = re.sub(r"《([a-z0-9])》", _sub_encircle, text, flags=re.IGNORECASE | re.UNICODE)
+    text = _RE_SYMBOL.sub(_sub_encircle, text)
     # remove empty formatting hints
-    text = re.sub(r"\[\[[a-z]]]\s*\[\[/]]\s*", r" ", text, flags=re.IGNORECASE | re.UNICODE)
+    text = _RE_EMPTY_HINT.sub(r" ", text)
     # replace formatting hints with brackets
-    text = re.sub(r"\[\[[a-z]]]([^\[]*?)\s*\[\[/]]\s*", r"[\1] ", text, flags=re.IGNORECASE | re.UNICODE)
+    text = _RE_HINT.sub(r"[\1] ", text)
     # relocate misplaced spaces at start of bracketed string
-    text = re.sub(r"\s*(\[)\s+([^]]*?])", r" \1\2", text, flags=re.IGNORECASE | re.UNICODE)
+    text = _RE_BRACKET_START.sub(r" \1\2", text)
     # relocate misplaced spaces at end of bracketed string
-    text = re.sub(r"(\[[^]]*?)\s+(])\s*", r"\1\2 ", text, flags=re.IGNORECASE | re.UNICODE)
+    text = _RE_BRACKET_END.sub(r"\1\2 ", text)
     # place line breaks
-    return re.sub(r"\s*\[\[br]]\s*", "\n\n", text, flags=re.IGNORECASE | re.UNICODE)
+    return _RE_BR.sub("\n\n", text)
+
+
+class _Unsupported(Exception):
+    pass
+
+
+# line break marker in single-pass output
+_BR = object()
+
+
+def _normalize_text(text: str) -> str:
+    # single pass over the text, producing the same output as _normalize_text_stepwise
+    out: list = []
+    # drop whitespace following a line break
+    strip = False
+    # end of the last unmarked EX-BURST marker
+    burst_end = None
+    # empty formatting hints right after a formatting hint leave no space
+    after_hint = False
+    # inside an unconverted "[[ex]]" hint
+    in_ex_hint = False
+
+    def emit(chunk: str) -> None:
+        nonlocal strip, after_hint
+        if strip:
+            chunk = chunk.lstrip()
+            strip = not chunk
+
+        if chunk:
+            out.append(chunk)
+            after_hint = False
+
+    def strip_end() -> None:
+        # drop trailing whitespace, but not across line breaks
+        while out and out[-1] is not _BR:
+            if chunk := out[-1].rstrip():
+                out[-1] = chunk
+                return
+
+            out.pop()
+
+    pos = 0
+    for match in _RE_TOKEN.finditer(text):
+        emit(text[pos:match.start()])
+        pos = match.end()
+        kind = match.lastgroup
+
+        if in_ex_hint and kind not in ("symbol", "element", "end_hint"):
+            raise _Unsupported()
+
+        if kind == "symbol":
+            symbol = match.group("symbol")
+            emit("♦" if symbol == "C" else encircle_symbol(symbol, False))
+
+        elif kind == "element":
+            emit(encircle_symbol(_ELEMENTS_MAP[match.group("element")], False))
+
+        elif kind == "dull":
+            emit("[⤵]")
+
+        elif kind == "br":
+            strip_end()
+            out.append(_BR)
+            strip = True
+
+        elif kind == "hint":
+            hint_text = match.group("hint_text")
+            if not hint_text:
+                if not after_hint:
+                    emit(" ")
+                continue
+
+            # symbols introducing brackets or markers, or stray brackets would break the hint
+            if "《ダル》" in hint_text or "EX BURST" in hint_text or "]" in hint_text:
+                raise _Unsupported()
+
+            hint_text = _RE_HINT_SYMBOL.sub(_sub_hint_symbol, hint_text)
+            if hint_text[0].isspace():
+                # relocate misplaced spaces at start of bracketed string
+                strip_end()
+                emit(f" [{hint_text.lstrip()}] ")
+            else:
+                emit(f"[{hint_text}] ")
+
+            after_hint = True
+
+        elif kind == "burst":
+            # markers this close could consume each other's surroundings
+            if burst_end is not None and match.start() - burst_end < 8:
+                raise _Unsupported()
+
+            burst_end = pos
+            emit("[EX BURST] ")
+
+        elif kind == "ex_burst":
+            emit("[EX BURST] ")
+
+        elif kind == "damage":
+            emit(f"[{match.group('damage_type')} {match.group('damage_value')}] – ")
+
+        elif kind == "ex_hint":
+            # "[[ex]]" hints not containing "EX BURST" are kept as they are
+            in_ex_hint = True
+            emit(match.group())
+
+        elif kind == "end_hint" and in_ex_hint:
+            in_ex_hint = False
+            emit(match.group())
+
+        else:
+            # stray brackets or unknown formatting hints
+            raise _Unsupported()
+
+    if in_ex_hint:
+        raise _Unsupported()
+
+    emit(text[pos:])
+
+    return "".join(
+        "\n\n" if chunk is _BR else chunk
+        for chunk in out
+    )
+
+
+def _load_text(language: Language, data: dict) -> str:
+    # load text, normalized on first access
+    return str(data[f"Text{language.key_suffix}"])
+
+
+def _normalize_card_text(text: str) -> str:
+    try:
+        return _normalize_text(text)
+
+    except _Unsupported:
+        # rare markup combinations
+        return _normalize_text_stepwise(text)
+
+
+# one shared tuple per element combination
+_ELEMENTS_INTERNED: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+
+def _intern_elements(elements: Iterable[str]) -> tuple[str, ...]:
+    elements = tuple(elements)
+    return _ELEMENTS_INTERNED.setdefault(elements, elements)
 
 
 class Card:
+    __slots__ = ("__code", "__elements", "__content", "__raw_texts", "__index")
+
+    # per language: name, text, face
+    __FIELDS = 3
+
     def __init__(self, code: Code, elements: list[str], content: dict[Language, CardContent], index: int = 0):
         self.__code: Code = code
-        self.__elements: list[str] = elements
-        self.__content: dict[Language, CardContent] = content
+        self.__elements: tuple[str, ...] = _intern_elements(elements)
+        # flat content by language ordinal, name is None for missing languages
+        self.__content: list[Optional[str]] = [None] * (len(API_LANGS) * Card.__FIELDS)
+        # bit mask of language ordinals with texts not yet normalized
+        self.__raw_texts: int = 0
         self.__index = index
 
+        for language, language_content in content.items():
+            self[language] = language_content
+
     @classmethod
     def from_square_api_data(cls, data: dict[str, Any]) -> Card:
         if not data:
@@ -102,54 +306,121 @@ class Card:
             code = Code(data["Code"])
 
             if code.opus == "C":
-                elements = ["Crystal"]
-                content = {
-                    language: CardContent(
-                        name=_load_type(language, data),
-                        text="",
-                        face="",
-                    )
-                    for language in API_LANGS
-                }
+                return cls(
+                    code=code,
+                    elements=["Crystal"],
+                    content={
+                        language: CardContent(
+                            name=_load_type(language, data),
+                            text="",
+                            face="",
+                        )
+                        for language in API_LANGS
+                    },
+                )
 
             else:
-                elements = [
-                    _ELEMENTS_MAP[element]
-                    for element in data["Element"].split("/")
-                ]
-                content = {
-                    language: CardContent(
-                        name=_load_name(language, data),
-                        text=_load_text(language, data),
-                        face="",
-                    )
-                    for language in API_LANGS
-                }
-
-            return cls(
-                code=code,
-                elements=elements,
-                content=content,
+                card = cls(
+                    code=code,
+                    elements=[
+                        _ELEMENTS_MAP[element]
+                        for element in data["Element"].split("/")
+                    ],
+                    content={
+                        language: CardContent(
+                            name=_load_name(language, data),
+                            text=_load_text(language, data),
+                            face="",
+                        )
+                        for language in API_LANGS
+                    },
+                )
+
+                # texts are normalized on first access
+                card.__raw_texts = (1 << len(API_LANGS)) - 1
+                return card
+
+    def __getstate__(self) -> tuple:
+        # store normalized texts, so loaded cards are ready to use
+        for ordinal in range(len(API_LANGS)):
+            self.__normalize(ordinal)
+
+        return self.__code, self.__elements, self.__content, self.__index
+
+    def __setstate__(self, state: tuple | dict[str, Any]) -> None:
+        if isinstance(state, dict):
+            # pickled before __slots__
+            self.__init__(
+                code=state["_Card__code"],
+                elements=state["_Card__elements"],
+                content=state["_Card__content"],
+                index=state["_Card__index"],
             )
 
+        else:
+            self.__code, elements, self.__content, self.__index = state
+            self.__elements = _intern_elements(elements)
+            self.__content[2::Card.__FIELDS] = [
+                face if face is None else sys.intern(face)
+                for face in self.__content[2::Card.__FIELDS]
+            ]
+            self.__raw_texts = 0
+
     def __repr__(self) -> str:
-        return f"Card(code={self.code!r}, content={self.__content!r})"
+        content = {
+            language: self[language]
+            for language in API_LANGS
+            if language in self
+        }
+        return f"Card(code={self.code!r}, content={content!r})"
 
     def __str__(self) -> str:
-        if self.__content:
-            return f"'{self[''].name}' ({'/'.join(self.__elements)}, {self.code})"
+        if any(self.__content):
+            return f"'{self.name('')}' ({'/'.join(self.__elements)}, {self.code})"
 
-    def __getitem__(self, item: Language | str) -> CardContent:
-        if isinstance(item, Language):
-            return self.__content[item]
+    @staticmethod
+    def __ordinal(language: Language | str) -> int:
+        if isinstance(language, Language):
+            return language.ordinal
         else:
-            return self.__content[Language(item)]
+            return Language(language).ordinal
+
+    def __offset(self, language: Language | str) -> int:
+        offset = Card.__ordinal(language) * Card.__FIELDS
+        if self.__content[offset] is None:
+            raise KeyError(language)
+
+        return offset
+
+    def __normalize(self, ordinal: int) -> None:
+        if self.__raw_texts & (1 << ordinal):
+            offset = ordinal * Card.__FIELDS + 1
+            self.__content[offset] = _normalize_card_text(self.__content[offset])
+            self.__raw_texts &= ~(1 << ordinal)
+
+    def __contains__(self, language: Language | str) -> bool:
+        return self.__content[Card.__ordinal(language) * Card.__FIELDS] is not None
+
+    def __getitem__(self, item: Language | str) -> CardContent:
+        offset = self.__offset(item)
+        self.__normalize(offset // Card.__FIELDS)
+        return CardContent(*self.__content[offset:offset + Card.__FIELDS])
 
     def __setitem__(self, key: Language | str, value: CardContent) -> None:
-        if isinstance(key, Language):
-            self.__content[key] = value
-        else:
-            self.__content[Language(key)] = value
+        ordinal = Card.__ordinal(key)
+        offset = ordinal * Card.__FIELDS
+        self.__content[offset:offset + Card.__FIELDS] = value.name, value.text, sys.intern(value.face)
+        self.__raw_texts &= ~(1 << ordinal)
+
+    # without normalizing the text
+    def name(self, language: Language | str) -> str:
+        return self.__content[self.__offset(language)]
+
+    def face(self, language: Language | str) -> str:
+        return self.__content[self.__offset(language) + 2]
+
+    def set_face(self, language: Language | str, face: str) -> None:
+        self.__content[self.__offset(language) + 2] = sys.intern(face)
 
     # 6-048C
     @property
@@ -157,7 +428,7 @@ class Card:
         return self.__code
 
     @property
-    def elements(self) -> list[str]:
+    def elements(self) -> tuple[str, ...]:
         return self.__elements
 
     @property
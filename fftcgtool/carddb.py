@@ -1,27 +1,46 @@
 from __future__ import annotations
 
+import atexit
 import io
 import json
+import logging
+import os
 import pickle
+import shutil
+import sqlite3
+import tempfile
 import zipfile
 from os import PathLike
-from typing import IO
-
-import requests
+from typing import IO, Iterable, MutableMapping, Optional
 
 from .card import Card
+from .cardindex import CardIndex
 from .cards import Cards
 from .code import Code
-from .language import API_LANGS
+from .fetcher import Fetcher, FetchError
+from .grid import Grid
+from .language import API_LANGS, Language
+from .metrics import Metrics
+from .sqlitedb import SQLiteDB, is_sqlite
+from .utils import GRID, atomic_write, tier_file_name
 
 
 class CardDB:
     _instance: CardDB = None
-    _cards: dict[Code, Card]
-    _face_to_url: dict[str, str]
+    _cards: MutableMapping[Code, Card]
+    _face_to_url: MutableMapping[str, str]
+    # face -> grid the page was built with
+    _face_grids: dict[str, list[int]]
+    _sqlite_db: Optional[SQLiteDB] = None
+    _index: Optional[CardIndex] = None
 
     _DB_FILE_NAME = "cards.pickle"
     _MAPPING_FILE_NAME = "face_to_url.json"
+    _GRIDS_FILE_NAME = "face_grids.json"
+    _INDEX_FILE_NAME = "card_index.pickle"
+    _SQLITE_SUFFIXES = (".sqlite", ".db")
+    _JOURNAL_SUFFIX = ".journal"
+    _ENTRY_SUFFIX = ".pickle"
 
     def __new__(cls, *more) -> CardDB:
         if CardDB._instance is None:
@@ -31,32 +50,175 @@ class CardDB:
 
     def __init__(self, db_url: str = None):
         if db_url is not None:
-            try:
-                with open(db_url, "rb") as db_file:
-                    self._load(db_file)
+            if os.path.exists(db_url):
+                self._load(db_url, read_only=True)
+
+            else:
+                try:
+                    res = Fetcher().get(db_url)
+                except FetchError as cause:
+                    raise ValueError("Invalid URL given to CardDB!") from cause
 
-            except FileNotFoundError:
-                res = requests.get(db_url, stream=True)
                 if not res.ok:
                     raise ValueError("Invalid URL given to CardDB!")
 
-                self._load(io.BytesIO(res.content))
+                self._load(io.BytesIO(res.content), read_only=True)
+
+    @staticmethod
+    def _read_zip(db: str | PathLike[str] | IO[bytes]) \
+            -> tuple[dict[Code, Card], dict[str, str], dict[str, list[int]], Optional[CardIndex]]:
+        index = None
+        # all pages had the default grid before it was recorded
+        face_grids = {}
 
-    def _load(self, db: str | PathLike[str] | IO[bytes]):
         try:
             # unpickle db file
             with zipfile.ZipFile(db, "r") as zip_file:
                 # cards db
                 with zip_file.open(CardDB._DB_FILE_NAME, "r") as file:
-                    self._cards = pickle.load(file)
+                    cards = pickle.load(file)
 
                 # face_to_url mapping
                 with zip_file.open(CardDB._MAPPING_FILE_NAME, "r") as file:
-                    self._face_to_url = json.load(file)
+                    face_to_url = json.load(file)
+
+                # grids of pages
+                if CardDB._GRIDS_FILE_NAME in zip_file.namelist():
+                    with zip_file.open(CardDB._GRIDS_FILE_NAME, "r") as file:
+                        face_grids = json.load(file)
+
+                # secondary indexes
+                if CardDB._INDEX_FILE_NAME in zip_file.namelist():
+                    with zip_file.open(CardDB._INDEX_FILE_NAME, "r") as file:
+                        index = pickle.load(file)
+
+        except FileNotFoundError:
+            cards = {}
+            face_to_url = {}
+
+        # changes saved since the last compaction
+        if isinstance(db, (str, PathLike)):
+            logger = logging.getLogger(__name__)
+
+            for entry_path in CardDB._journal_entries(db):
+                try:
+                    with open(entry_path, "rb") as file:
+                        # entries from before grids were recorded have no grids
+                        changed_cards, changed_faces, changed_grids = (*pickle.load(file), {})[:3]
+
+                except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError) as cause:
+                    # e.g. cut short by a power loss, the changes are lost but the DB stays usable
+                    logger.warning(f"Skipping unreadable CardDB journal entry {entry_path!r}: {cause}")
+                    continue
+
+                cards.update(changed_cards)
+                face_grids.update(changed_grids)
+                for face, url in changed_faces.items():
+                    if url is None:
+                        face_to_url.pop(face, None)
+                    else:
+                        face_to_url[face] = url
+
+                if index is not None:
+                    for card in changed_cards.values():
+                        index.add(card)
+
+                Metrics().add("carddb.load", journal_entries=1)
+
+        return cards, face_to_url, face_grids, index
+
+    @staticmethod
+    def _journal_path(db: str | PathLike[str]) -> str:
+        return f"{os.fspath(db)}{CardDB._JOURNAL_SUFFIX}"
+
+    @staticmethod
+    def _journal_entries(db: str | PathLike[str]) -> list[str]:
+        # journal entry files in the order they were written
+        try:
+            names = [
+                name
+                for name in os.listdir(CardDB._journal_path(db))
+                if name.endswith(CardDB._ENTRY_SUFFIX) and name[:-len(CardDB._ENTRY_SUFFIX)].isdigit()
+            ]
 
         except FileNotFoundError:
-            self._cards = {}
-            self._face_to_url = {}
+            return []
+
+        names.sort(key=lambda name: int(name[:-len(CardDB._ENTRY_SUFFIX)]))
+        return [os.path.join(CardDB._journal_path(db), name) for name in names]
+
+    def _load(self, db: str | PathLike[str] | IO[bytes], read_only: bool = False):
+        with Metrics().stage("carddb.load"):
+            self.__load(db, read_only)
+
+    def __load(self, db: str | PathLike[str] | IO[bytes], read_only: bool):
+        if isinstance(db, (str, PathLike)):
+            try:
+                with open(db, "rb") as file:
+                    header = file.read(16)
+
+            except FileNotFoundError:
+                # new DB, format chosen by file name
+                use_sqlite = str(db).endswith(CardDB._SQLITE_SUFFIXES)
+
+            else:
+                use_sqlite = is_sqlite(header)
+
+            if use_sqlite:
+                self._sqlite_db = SQLiteDB(db, read_only)
+
+        elif is_sqlite(db.read(16)):
+            # SQLite needs an actual file
+            fd, tmp_path = tempfile.mkstemp(suffix=CardDB._SQLITE_SUFFIXES[0])
+            with os.fdopen(fd, "wb") as file:
+                db.seek(0)
+                shutil.copyfileobj(db, file)
+
+            atexit.register(os.remove, tmp_path)
+            self._sqlite_db = SQLiteDB(tmp_path, read_only=True)
+
+        else:
+            db.seek(0)
+
+        if self._sqlite_db is not None:
+            # cards are read on demand
+            self._cards = self._sqlite_db.cards
+            self._face_to_url = self._sqlite_db.face_to_url
+
+            try:
+                self._face_grids = self._sqlite_db.meta[CardDB._GRIDS_FILE_NAME]
+            except (KeyError, sqlite3.OperationalError):
+                self._face_grids = {}
+
+        else:
+            self._cards, self._face_to_url, self._face_grids, self._index = CardDB._read_zip(db)
+
+    @property
+    def _card_index(self) -> CardIndex:
+        if self._index is None and self._sqlite_db is not None:
+            try:
+                self._index = self._sqlite_db.meta[CardDB._INDEX_FILE_NAME]
+            except (KeyError, sqlite3.OperationalError):
+                pass
+
+        if self._index is None:
+            # DB without indexes, build them once
+            self._index = CardIndex()
+            for card in self._cards.values():
+                self._index.add(card)
+
+        return self._index
+
+    def query(self,
+              elements: Optional[Iterable[str]] = None,
+              multi: bool = False,
+              opus: Optional[Iterable[str]] = None,
+              rarity: Optional[Iterable[str]] = None,
+              name: Optional[str] = None,
+              language: Optional[Language] = None,
+              codes: Optional[Iterable[Code]] = None) -> list[Code]:
+        # codes of matching cards, sorted by name (if language given), then by opus and serial
+        return self._card_index.query(elements, multi, opus, rarity, name, language, codes)
 
     def __contains__(self, item: Code) -> bool:
         return item in self._cards
@@ -70,18 +232,37 @@ class CardDB:
         except KeyError:
             return face
 
+    def get_face_grid(self, face: str) -> Grid:
+        return Grid(self._face_grids.get(face, GRID))
+
     def save(self) -> None:
         return
 
     def update(self, cards: Cards) -> None:
         return
 
-    def upload_prompt(self) -> None:
+    def migrate(self, db_path: str | PathLike[str]) -> None:
+        return
+
+    def set_face_grid(self, faces: Iterable[str], grid: Grid) -> None:
+        return
+
+    def compact(self) -> None:
+        return
+
+    def invalidate_faces(self, faces: Iterable[str]) -> None:
+        return
+
+    def upload_prompt(self, tiers: Iterable[str] = ()) -> None:
         return
 
 
 class RWCardDB(CardDB):
     __db_path: str | PathLike[str]
+    # changes not yet saved, a face URL of None is a removed face
+    __changed_cards: dict[Code, Card]
+    __changed_faces: dict[str, Optional[str]]
+    __changed_grids: dict[str, list[int]]
 
     def __new__(cls, *more) -> RWCardDB:
         if CardDB._instance is None:
@@ -94,10 +275,58 @@ class RWCardDB(CardDB):
 
         if db_path is not None:
             self.__db_path = db_path
+            self.__changed_cards, self.__changed_faces, self.__changed_grids = {}, {}, {}
             self._load(self.__db_path)
 
     def save(self) -> None:
-        with zipfile.ZipFile(self.__db_path, "w", compression=zipfile.ZIP_LZMA) as zip_file:
+        with Metrics().stage("carddb.save"):
+            self.__save()
+
+    def __save(self) -> None:
+        if self._sqlite_db is not None:
+            self._sqlite_db.meta[CardDB._INDEX_FILE_NAME] = self._card_index
+            self._sqlite_db.meta[CardDB._GRIDS_FILE_NAME] = self._face_grids
+            self._sqlite_db.commit()
+            return
+
+        if not os.path.exists(self.__db_path):
+            # new DB, start with a snapshot
+            self.__compact()
+            return
+
+        if not self.__changed_cards and not self.__changed_faces and not self.__changed_grids:
+            return
+
+        # append only the changes, the snapshot is rewritten by compact()
+        journal_path = CardDB._journal_path(self.__db_path)
+        os.makedirs(journal_path, exist_ok=True)
+
+        entries = CardDB._journal_entries(self.__db_path)
+        number = int(os.path.basename(entries[-1])[:-len(CardDB._ENTRY_SUFFIX)]) + 1 if entries else 0
+        entry_path = os.path.join(journal_path, f"{number:06d}{CardDB._ENTRY_SUFFIX}")
+
+        # an interrupted save leaves no partial entry
+        with atomic_write(entry_path, "wb", durable=True) as file:
+            pickle.dump((self.__changed_cards, self.__changed_faces, self.__changed_grids), file)
+
+        Metrics().add("carddb.save", cards=len(self.__changed_cards), faces=len(self.__changed_faces))
+        self.__changed_cards, self.__changed_faces, self.__changed_grids = {}, {}, {}
+
+    def compact(self) -> None:
+        with Metrics().stage("carddb.save"):
+            self.__compact()
+
+    def __compact(self) -> None:
+        if self._sqlite_db is not None:
+            # SQLite DBs are saved incrementally anyway
+            self._sqlite_db.commit()
+            return
+
+        # fold the journal into a new snapshot
+        entries = CardDB._journal_entries(self.__db_path)
+
+        with atomic_write(self.__db_path, "wb", durable=True) as db_file, \
+                zipfile.ZipFile(db_file, "w", compression=zipfile.ZIP_LZMA) as zip_file:
             # cards db
             with zip_file.open(CardDB._DB_FILE_NAME, "w") as file:
                 pickle.dump(self._cards, file)
@@ -106,17 +335,79 @@ class RWCardDB(CardDB):
             with zip_file.open(CardDB._MAPPING_FILE_NAME, "w") as file:
                 file.write(json.dumps(self._face_to_url, indent=2).encode("utf-8"))
 
+            # grids of pages
+            with zip_file.open(CardDB._GRIDS_FILE_NAME, "w") as file:
+                file.write(json.dumps(self._face_grids, indent=2).encode("utf-8"))
+
+            # secondary indexes
+            with zip_file.open(CardDB._INDEX_FILE_NAME, "w") as file:
+                pickle.dump(self._card_index, file)
+
+        # replaying entries again is harmless, so they are removed only after the snapshot is in place
+        for entry_path in entries:
+            os.remove(entry_path)
+
+        Metrics().add("carddb.save", cards=len(self._cards), faces=len(self._face_to_url))
+        self.__changed_cards, self.__changed_faces, self.__changed_grids = {}, {}, {}
+
     def update(self, cards: Cards) -> None:
         for card in cards:
+            # keep faces of languages not built with these cards
+            try:
+                old_card = self._cards[card.code]
+            except KeyError:
+                old_card = None
+            else:
+                for lang in API_LANGS:
+                    if lang in card and lang in old_card and not card.face(lang):
+                        card.set_face(lang, old_card.face(lang))
+
             self._cards[card.code] = card
+            self._card_index.add(card)
+
+            # unchanged cards are not journaled again
+            if old_card is None or old_card.__getstate__() != card.__getstate__():
+                self.__changed_cards[card.code] = card
+
+    def migrate(self, db_path: str | PathLike[str]) -> None:
+        # import everything from a legacy zip DB
+        cards, face_to_url, face_grids, _ = CardDB._read_zip(db_path)
+        self._cards.update(cards)
+        self._face_to_url.update(face_to_url)
+        self._face_grids.update(face_grids)
+        self.__changed_cards.update(cards)
+        self.__changed_faces.update(face_to_url)
+        self.__changed_grids.update(face_grids)
 
-    def upload_prompt(self) -> None:
+        for card in cards.values():
+            self._card_index.add(card)
+
+    def set_face_grid(self, faces: Iterable[str], grid: Grid) -> None:
+        # decks need the grid pages were built with, not the current one
+        for face in faces:
+            if self._face_grids.get(face) != list(grid):
+                self._face_grids[face] = self.__changed_grids[face] = list(grid)
+
+    def invalidate_faces(self, faces: Iterable[str]) -> None:
+        # rewritten faces need to be uploaded again
+        for face in faces:
+            if self._face_to_url.pop(face, None) is not None:
+                self.__changed_faces[face] = None
+
+    def upload_prompt(self, tiers: Iterable[str] = ()) -> None:
         faces = list(set([
-            card[lang].face
+            card.face(lang)
             for card in self._cards.values()
             for lang in API_LANGS
-            if card[lang].face
+            if card.face(lang)
         ]))
+
+        # tiers of each page are uploaded separately
+        faces += [
+            tier_file_name(face, tier)
+            for tier in tiers
+            for face in faces
+        ]
         faces.sort()
 
         for face in faces:
@@ -124,3 +415,4 @@ class RWCardDB(CardDB):
                 face_url = input(f"Upload '{face}' and paste URL: ")
                 if face_url:
                     self._face_to_url[face] = face_url
+                    self.__changed_faces[face] = face_url
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from typing import Iterable, Optional
+
+from .card import Card
+from .code import Code
+from .language import API_LANGS, Language
+
+
+class CardIndex:
+    def __init__(self):
+        # secondary key -> codes
+        self.__by_elements: dict[str, set[Code]] = {}
+        self.__by_opus: dict[str, set[Code]] = {}
+        self.__by_rarity: dict[str, set[Code]] = {}
+        self.__by_name: dict[Language, dict[str, set[Code]]] = {
+            language: {}
+            for language in API_LANGS
+        }
+
+        # code -> secondary keys, for updating and sorting
+        self.__keys: dict[Code, tuple[str, str, str, dict[Language, str]]] = {}
+
+    @staticmethod
+    def __elements_key(elements: Iterable[str]) -> str:
+        return "/".join(elements)
+
+    def __discard(self, code: Code) -> None:
+        try:
+            elements, opus, rarity, names = self.__keys.pop(code)
+
+        except KeyError:
+            return
+
+        self.__by_elements[elements].discard(code)
+        self.__by_opus[opus].discard(code)
+        self.__by_rarity[rarity].discard(code)
+        for language, name in names.items():
+            self.__by_name[language][name].discard(code)
+
+    def add(self, card: Card) -> None:
+        code = card.code
+        self.__discard(code)
+
+        elements = CardIndex.__elements_key(card.elements)
+        names = {
+            language: card.name(language)
+            for language in API_LANGS
+        }
+
+        self.__keys[code] = elements, code.opus, code.rarity, names
+        self.__by_elements.setdefault(elements, set()).add(code)
+        self.__by_opus.setdefault(code.opus, set()).add(code)
+        self.__by_rarity.setdefault(code.rarity, set()).add(code)
+        for language, name in names.items():
+            self.__by_name[language].setdefault(name, set()).add(code)
+
+    def __len__(self) -> int:
+        return len(self.__keys)
+
+    def query(self,
+              elements: Optional[Iterable[str]] = None,
+              multi: bool = False,
+              opus: Optional[Iterable[str]] = None,
+              rarity: Optional[Iterable[str]] = None,
+              name: Optional[str] = None,
+              language: Optional[Language] = None,
+              codes: Optional[Iterable[Code]] = None) -> list[Code]:
+        # candidate sets, one per given criterion
+        candidates: list[set[Code]] = []
+
+        def union(index: dict[str, set[Code]], keys: Iterable[str]) -> set[Code]:
+            return set().union(*(
+                index.get(key, set())
+                for key in keys
+            ))
+
+        if elements is not None:
+            candidates.append(union(self.__by_elements, elements))
+
+        if multi:
+            candidates.append(union(self.__by_elements, [
+                key
+                for key in self.__by_elements
+                if "/" in key
+            ]))
+
+        if opus is not None:
+            candidates.append(union(self.__by_opus, opus))
+
+        if rarity is not None:
+            candidates.append(union(self.__by_rarity, rarity))
+
+        if name is not None:
+            candidates.append(self.__by_name[language or Language("")].get(name, set()))
+
+        if codes is not None:
+            candidates.append(set(codes) & self.__keys.keys())
+
+        if candidates:
+            # intersect, starting with the smallest set
+            candidates.sort(key=len)
+            result = candidates[0].intersection(*candidates[1:])
+        else:
+            result = set(self.__keys)
+
+        # stable order: by name (if language given), then by opus and serial
+        if language is not None:
+            return sorted(result, key=lambda code: (self.__keys[code][3][language], code.opus, code.serial))
+        else:
+            return sorted(result, key=lambda code: (code.opus, code.serial))
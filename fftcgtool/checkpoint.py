@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import os
+from os import PathLike
+from typing import Optional, TextIO
+
+
+class Checkpoint:
+    def __init__(self, path: str | PathLike[str] = None):
+        # IDs already done in earlier runs
+        self.__done: set[str] = set()
+        self.__file: Optional[TextIO] = None
+
+        if path is not None:
+            try:
+                with open(path, "r") as file:
+                    self.__done = set(line.strip() for line in file if line.strip())
+
+            except FileNotFoundError:
+                pass
+
+            self.__file = open(path, "a")
+
+    def __enter__(self) -> Checkpoint:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def resuming(self) -> bool:
+        return bool(self.__done)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.__done
+
+    def add(self, item_id: str) -> None:
+        self.__done.add(item_id)
+
+        # persist right away, so an interrupted run can resume here
+        if self.__file is not None:
+            self.__file.write(f"{item_id}\n")
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+
+    def close(self) -> None:
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import io
+import logging
+import os
+import shutil
+import zipfile
+from os import PathLike
+from typing import IO, Optional
+
+from .grid import Grid
+from .language import Language
+from .ttsdeck import TTSDeck
+from .utils import GRID, atomic_write
+
+
+class DeckWriter:
+    _STAGING_SUFFIX = ".partial"
+
+    def __init__(self, language: Language, compact: bool = False,
+                 zip_path: str | PathLike[str] | IO[bytes] = None, append: bool = False,
+                 grid: Grid = GRID, tier: Optional[str] = None):
+        self.__language = language
+        self.__compact = compact
+        self.__zip_path = zip_path
+        self.__append = append
+        # layout of the pages, and which of their tiers to use
+        self.__grid = grid
+        self.__tier = tier
+        # only for streams, zip files on disk are built on close
+        self.__zip_file: Optional[zipfile.ZipFile] = None
+        # resumed runs also add the decks staged before being interrupted
+        self.__staged = append and isinstance(zip_path, (str, PathLike)) and os.path.isdir(self.__staging_path)
+
+    def __enter__(self) -> DeckWriter:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def __staging_path(self) -> str:
+        # decks written to a zip file on disk, kept until it is built
+        return f"{os.fspath(self.__zip_path)}{DeckWriter._STAGING_SUFFIX}"
+
+    def write(self, deck: TTSDeck) -> None:
+        logger = logging.getLogger(__name__)
+        logger.debug(f"Saving Deck {deck!r}")
+
+        # decks built for a language are written in that language
+        language = deck.language or self.__language
+
+        if self.__zip_path is None:
+            deck.save(language, self.__compact, self.__grid, self.__tier)
+            return
+
+        if not isinstance(self.__zip_path, (str, PathLike)):
+            if self.__zip_file is None:
+                # only create zip file once there are decks
+                self.__zip_file = zipfile.ZipFile(self.__zip_path, "w", compression=zipfile.ZIP_DEFLATED)
+
+            with io.TextIOWrapper(self.__zip_file.open(deck.file_name, "w"), "utf-8") as file:
+                deck.write(file, language, self.__compact, self.__grid, self.__tier)
+
+            return
+
+        if not self.__staged:
+            # decks staged by an interrupted run are only kept when resuming it
+            if not self.__append:
+                shutil.rmtree(self.__staging_path, ignore_errors=True)
+
+            os.makedirs(self.__staging_path, exist_ok=True)
+            self.__staged = True
+
+        # durable once written, so a checkpoint may record the deck
+        path = os.path.join(self.__staging_path, deck.file_name)
+        with atomic_write(path, "w", durable=True, encoding="utf-8") as file:
+            deck.write(file, language, self.__compact, self.__grid, self.__tier)
+
+    def __build_zip(self) -> None:
+        logger = logging.getLogger(__name__)
+
+        staged = sorted(
+            name
+            for name in os.listdir(self.__staging_path)
+            if not name.endswith(".tmp")
+        )
+
+        # an interrupted run never leaves a broken zip file
+        with atomic_write(self.__zip_path, "wb", durable=True) as file, \
+                zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+            if self.__append and os.path.exists(self.__zip_path):
+                # decks of earlier runs, unless written again
+                staged_names = set(staged)
+                with zipfile.ZipFile(self.__zip_path, "r") as old_zip_file:
+                    for info in old_zip_file.infolist():
+                        if info.filename not in staged_names:
+                            zip_file.writestr(info, old_zip_file.read(info))
+
+            for name in staged:
+                zip_file.write(os.path.join(self.__staging_path, name), name)
+
+        shutil.rmtree(self.__staging_path, ignore_errors=True)
+        logger.debug(f"Wrote {len(staged)} Decks to {self.__zip_path}")
+
+    def close(self) -> None:
+        # also writes the zip directory
+        if self.__zip_file is not None:
+            self.__zip_file.close()
+            self.__zip_file = None
+
+        if self.__staged:
+            self.__build_zip()
+            self.__staged = False
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from .metrics import Metrics
+
+
+class FetchError(Exception):
+    pass
+
+
+class RateLimiter:
+    def __init__(self, rate: float):
+        # requests per second
+        self.__interval = 1 / rate
+        self.__next = 0.0
+        self.__lock = threading.Lock()
+
+    def wait(self) -> None:
+        # reserve the next free slot, then sleep until it comes
+        with self.__lock:
+            now = time.monotonic()
+            slot = max(now, self.__next)
+            self.__next = slot + self.__interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Fetcher:
+    _instance: Fetcher = None
+    _max_retries: int = 5
+    _retry_budget: int = 100
+    _rate_limits: dict[str, RateLimiter] = {}
+
+    __local = threading.local()
+    __lock = threading.Lock()
+
+    # (connect, read) timeouts in seconds, so stalled hosts are retried
+    _TIMEOUT = (10, 60)
+    # backoff delays in seconds
+    _BACKOFF_BASE = 0.5
+    _BACKOFF_MAX = 30.0
+    # responses worth retrying
+    _RETRY_STATUS = frozenset([429, 500, 502, 503, 504])
+
+    def __new__(cls, *more) -> Fetcher:
+        if Fetcher._instance is None:
+            Fetcher._instance = object.__new__(Fetcher)
+
+        return Fetcher._instance
+
+    def __init__(self, max_retries: int = None, retry_budget: int = None):
+        if max_retries is not None:
+            self._max_retries = max_retries
+
+        if retry_budget is not None:
+            self._retry_budget = retry_budget
+
+    def limit_rate(self, host: str, rate: float) -> None:
+        # at most rate requests per second to host, 0 for unlimited
+        if rate > 0:
+            self._rate_limits[host] = RateLimiter(rate)
+        else:
+            self._rate_limits.pop(host, None)
+
+    @property
+    def session(self) -> requests.Session:
+        # one pooled session per worker thread
+        try:
+            return Fetcher.__local.session
+
+        except AttributeError:
+            Fetcher.__local.session = requests.Session()
+            return Fetcher.__local.session
+
+    def __take_retry(self) -> bool:
+        with Fetcher.__lock:
+            if self._retry_budget <= 0:
+                return False
+
+            self._retry_budget -= 1
+            return True
+
+    def __backoff(self, attempt: int, res: requests.Response | None) -> float:
+        # honor the server's wish, if any
+        try:
+            return min(float(res.headers["Retry-After"]), Fetcher._BACKOFF_MAX)
+        except (AttributeError, KeyError, ValueError):
+            pass
+
+        # exponential backoff with full jitter
+        return random.uniform(0, min(Fetcher._BACKOFF_BASE * 2 ** attempt, Fetcher._BACKOFF_MAX))
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        logger = logging.getLogger(__name__)
+        kwargs.setdefault("timeout", Fetcher._TIMEOUT)
+
+        rate_limit = self._rate_limits.get(urlsplit(url).hostname)
+
+        for attempt in range(self._max_retries + 1):
+            if rate_limit is not None:
+                rate_limit.wait()
+
+            res = None
+            Metrics().add("http", requests=1)
+            try:
+                res = self.session.request(method, url, **kwargs)
+                if res.status_code not in Fetcher._RETRY_STATUS:
+                    Metrics().add("http", bytes=len(res.content))
+                    return res
+
+                reason = f"HTTP {res.status_code}"
+
+            except (requests.ConnectionError, requests.Timeout) as cause:
+                reason = f"{type(cause).__name__}: {cause}"
+
+            except requests.RequestException as cause:
+                # not worth retrying, e.g. malformed URLs
+                raise FetchError(f"{method} {url} failed: {cause}") from cause
+
+            if attempt >= self._max_retries:
+                break
+
+            if not self.__take_retry():
+                logger.error("Retry budget exhausted!")
+                break
+
+            Metrics().add("http", retries=1)
+            delay = self.__backoff(attempt, res)
+            logger.warning(f"{method} {url} failed ({reason}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+        raise FetchError(f"{method} {url} failed after {attempt + 1} attempt(s): {reason}")
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
@@ -1,14 +1,16 @@
 from __future__ import annotations
 
+import collections
 import logging
 import re
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Iterable, Iterator, Optional
 
-import requests
-
 from .code import Code
+from .fetcher import FetchError
+from .responsecache import ResponseCache
 from .ttsdeck import TTSDeck
-from .utils import int_default
+from .utils import FFDECKS_API_URL, int_default
 
 
 def _sort_cards_by_type(data: dict[str, str | int]) -> int:
@@ -30,7 +32,6 @@ def _sort_cards_by_cost(data: dict[str, str | int]) -> int:
 
 
 class FFDecks(list[TTSDeck]):
-    __FFDECKS_API_URL = "https://ffdecks.com/api/deck"
     __RE_FFDECKS_ID = re.compile(r"((https?://)?ffdecks\.com(/+api)?/+deck/+)?([0-9]+).*", flags=re.UNICODE)
 
     @classmethod
@@ -52,11 +53,11 @@ class FFDecks(list[TTSDeck]):
         logger = logging.getLogger(__name__)
 
         # api request
-        if not (res := requests.get(FFDecks.__FFDECKS_API_URL, params={"deck_id": deck_id})).ok:
+        if (data := ResponseCache().get_json("GET", FFDECKS_API_URL, params={"deck_id": deck_id})) is None:
             logger.error(f"Invalid Deck ID '{deck_id}' for FFDecks API!")
 
         else:
-            name = f"{res.json()['name']}"
+            name = f"{data['name']}"
             logger.info(f"Importing Deck {name!r}")
 
             # pre-extract usable data
@@ -65,7 +66,7 @@ class FFDecks(list[TTSDeck]):
                 "type": card["card"]["type"],
                 "cost": int_default(card["card"]["cost"], 0),
                 "count": int_default(card["quantity"], 0),
-            } for card in res.json()["cards"]]
+            } for card in data["cards"]]
 
             # sort cards by type, then by cost
             card_data.sort(key=_sort_cards_by_cost)
@@ -92,24 +93,76 @@ class FFDecks(list[TTSDeck]):
                 "cards": card_data,
             }
 
-    def __init__(self, deck_ids: Iterable):
-        super().__init__()
+    @classmethod
+    def iter_decks(cls, deck_ids: Iterable, num_requests: int = 1,
+                   failed: Optional[list[str]] = None) -> Iterator[tuple[str, Optional[TTSDeck]]]:
+        # if failed is given, Decks that couldn't be fetched are skipped and their IDs added to it
         logger = logging.getLogger(__name__)
 
-        for deck_id in self.sanitized_ids(deck_ids):
+        def make_decks(deck_id: str, future: Future[Optional[dict]]) -> list[tuple[str, Optional[TTSDeck]]]:
+            try:
+                return [cls.__make_deck(deck_id, future)]
+
+            except FetchError as cause:
+                if failed is None:
+                    raise
+
+                logger.error(f"Couldn't import Deck '{deck_id}': {cause}")
+                failed.append(deck_id)
+                return []
+
+        # unique valid IDs, in order of appearance
+        unique_ids = {}
+        for deck_id in cls.sanitized_ids(deck_ids):
             if deck_id is None:
                 logger.error("Malformed Deck ID for FFDecks API!")
 
+            elif deck_id in unique_ids:
+                logger.info(f"Skipping duplicate Deck ID '{deck_id}'")
+
             else:
-                if (data := FFDecks.get_deck_data(deck_id)) is not None:
-                    codes = [
-                        # create list of code objects
-                        Code(card["code"])
-                        # for each card
-                        for card in data["cards"]
-                        # repeat to meet count
-                        for _ in range(card["count"])
-                    ]
-
-                    # create deck object
-                    self.append(TTSDeck(codes, data["name"], data["description"], True))
+                unique_ids[deck_id] = None
+
+        # concurrent api requests, yielding decks in order as soon as they are available
+        with ThreadPoolExecutor(num_requests) as executor:
+            pending = collections.deque()
+
+            try:
+                for deck_id in unique_ids:
+                    if len(pending) >= 2 * num_requests:
+                        yield from make_decks(*pending.popleft())
+
+                    pending.append((deck_id, executor.submit(cls.get_deck_data, deck_id)))
+
+                while pending:
+                    yield from make_decks(*pending.popleft())
+
+            finally:
+                # stopped early: don't request decks no longer needed
+                for _, future in pending:
+                    future.cancel()
+
+    @staticmethod
+    def __make_deck(deck_id: str, future: Future[Optional[dict]]) -> tuple[str, Optional[TTSDeck]]:
+        # rejected IDs have no deck
+        if (data := future.result()) is None:
+            return deck_id, None
+
+        codes = [
+            # create list of code objects
+            Code(card["code"])
+            # for each card
+            for card in data["cards"]
+            # repeat to meet count
+            for _ in range(card["count"])
+        ]
+
+        # create deck object
+        return deck_id, TTSDeck(codes, data["name"], data["description"], True)
+
+    def __init__(self, deck_ids: Iterable, num_requests: int = 1):
+        super().__init__(
+            deck
+            for _, deck in FFDecks.iter_decks(deck_ids, num_requests)
+            if deck is not None
+        )
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from os import PathLike
+from typing import Optional
+
+from .utils import IMAGES_DIR_NAME, atomic_write
+
+
+class ImageCache:
+    _instance: ImageCache = None
+    _directory: Optional[str | PathLike[str]] = None
+    _max_size: int = 0
+    _offline: bool = False
+    _missing_ttl: float = 0
+    # URL -> time it was found missing
+    _missing: Optional[dict[str, float]] = None
+    _missing_dirty: bool = False
+
+    _DATA_SUFFIX = ".jpg"
+    _META_SUFFIX = ".json"
+    _MISSING_FILE_NAME = "missing.json"
+
+    __lock = threading.Lock()
+
+    def __new__(cls, *more) -> ImageCache:
+        if ImageCache._instance is None:
+            ImageCache._instance = object.__new__(ImageCache)
+
+        return ImageCache._instance
+
+    def __init__(self, directory: str | PathLike[str] = None, max_size: int = 0, offline: bool = False,
+                 missing_ttl: float = 0):
+        if directory is not None:
+            self._directory = os.path.join(directory, IMAGES_DIR_NAME)
+            self._max_size = max_size
+            self._offline = offline
+            self._missing_ttl = missing_ttl
+            self._missing = None
+
+            os.makedirs(self._directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self._directory is not None
+
+    @property
+    def offline(self) -> bool:
+        return self._offline
+
+    def __paths(self, url: str) -> tuple[str, str]:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self._directory, key)
+        return f"{base}{ImageCache._DATA_SUFFIX}", f"{base}{ImageCache._META_SUFFIX}"
+
+    def get(self, url: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+
+        data_path, _ = self.__paths(url)
+        try:
+            with open(data_path, "rb") as file:
+                content = file.read()
+
+        except FileNotFoundError:
+            # not cached, or evicted by a concurrent run
+            return None
+
+        try:
+            # mark as recently used
+            os.utime(data_path)
+        except FileNotFoundError:
+            # evicted since, the content read is still valid
+            pass
+
+        return content
+
+    def __meta(self, url: str) -> dict[str, str]:
+        if not self.enabled:
+            return {}
+
+        _, meta_path = self.__paths(url)
+        try:
+            with open(meta_path, "r") as file:
+                return json.load(file)
+
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def headers(self, url: str) -> dict[str, str]:
+        meta = self.__meta(url)
+
+        # conditional request headers for revalidation
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        return headers
+
+    def put(self, url: str, content: bytes, headers: dict[str, str]) -> None:
+        if not self.enabled:
+            return
+
+        data_path, meta_path = self.__paths(url)
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+
+        with atomic_write(data_path, "wb") as file:
+            file.write(content)
+
+        with atomic_write(meta_path, "w") as file:
+            json.dump(meta, file)
+
+    def __missing_path(self) -> str:
+        return os.path.join(self._directory, ImageCache._MISSING_FILE_NAME)
+
+    def __missing_urls(self) -> dict[str, float]:
+        # loaded on first use, caller holds the lock
+        if self._missing is None:
+            try:
+                with open(self.__missing_path(), "r") as file:
+                    self._missing = json.load(file)
+
+            except (FileNotFoundError, ValueError):
+                self._missing = {}
+
+        return self._missing
+
+    def is_missing(self, url: str) -> bool:
+        # known not to exist, until the entry expires
+        if not self.enabled or self._missing_ttl <= 0:
+            return False
+
+        with ImageCache.__lock:
+            found_missing = self.__missing_urls().get(url)
+
+        return found_missing is not None and time.time() - found_missing < self._missing_ttl
+
+    def set_missing(self, url: str, missing: bool) -> None:
+        if not self.enabled or self._missing_ttl <= 0:
+            return
+
+        with ImageCache.__lock:
+            missing_urls = self.__missing_urls()
+
+            if missing:
+                missing_urls[url] = time.time()
+                self._missing_dirty = True
+
+            elif missing_urls.pop(url, None) is not None:
+                self._missing_dirty = True
+
+    def flush(self) -> None:
+        # persist missing URLs, dropping expired ones
+        if not self.enabled:
+            return
+
+        with ImageCache.__lock:
+            if not self._missing_dirty:
+                return
+
+            now = time.time()
+            missing_urls = {
+                url: found_missing
+                for url, found_missing in self.__missing_urls().items()
+                if now - found_missing < self._missing_ttl
+            }
+
+            with atomic_write(self.__missing_path(), "w") as file:
+                json.dump(missing_urls, file, indent=2)
+
+            self._missing, self._missing_dirty = missing_urls, False
+
+    def evict(self) -> None:
+        if not self.enabled or self._max_size <= 0:
+            return
+
+        logger = logging.getLogger(__name__)
+
+        entries = []
+        for entry in os.scandir(self._directory):
+            if entry.name.endswith(ImageCache._DATA_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # evicted concurrently
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+
+        # drop least recently used entries first
+        entries.sort()
+        for _, size, data_path in entries:
+            if total_size <= self._max_size:
+                break
+
+            meta_path = data_path[:-len(ImageCache._DATA_SUFFIX)] + ImageCache._META_SUFFIX
+            for path in (data_path, meta_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+            total_size -= size
+            logger.debug(f"evicted {data_path} from image cache")
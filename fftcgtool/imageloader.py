@@ -1,10 +1,20 @@
+import collections
+import contextlib
+import hashlib
+import io
 import logging
-import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
 
-import requests
 from PIL import Image
 
+from .fetcher import Fetcher, FetchError
+from .grid import Grid
+from .imagecache import ImageCache
 from .language import Language
+from .metrics import Metrics
+from .tilestore import TileStore
 from .utils import RESOLUTION
 
 # constants
@@ -12,8 +22,84 @@ FALLBACK_LANGUAGE = Language("en")
 
 
 class ImageLoader:
+    # URLs already checked in this run, so each is requested only once
+    __validated: set[str] = set()
+    __missing: set[str] = set()
+    __lock = threading.Lock()
+
+    # responses for images the CDN doesn't have, others like 403 may be temporary
+    _MISSING_STATUS = frozenset([404, 410])
+
+    @classmethod
+    def __is_missing(cls, url: str) -> bool:
+        with ImageLoader.__lock:
+            if url in ImageLoader.__missing:
+                return True
+
+        # missing in an earlier run
+        cache = ImageCache()
+        return not cache.offline and cache.is_missing(url)
+
+    @classmethod
+    def _fetch(cls, url: str) -> Optional[bytes]:
+        with Metrics().stage("image.fetch"):
+            return cls.__fetch(url)
+
+    @classmethod
+    def __fetch(cls, url: str) -> Optional[bytes]:
+        logger = logging.getLogger(__name__)
+        cache = ImageCache()
+
+        if cls.__is_missing(url):
+            logger.debug(f"known missing {url}")
+            Metrics().add("image.fetch", missing=1)
+            return None
+
+        with ImageLoader.__lock:
+            validated = url in ImageLoader.__validated
+
+        cached = cache.get(url)
+
+        # offline mode: only ever use cached content
+        if cache.offline or (validated and cached is not None):
+            Metrics().add("image.fetch", hits=int(cached is not None), missing=int(cached is None))
+            return cached
+
+        # revalidate cached content using a conditional request
+        headers = cache.headers(url) if cached is not None else {}
+
+        # fetch image
+        res = Fetcher().get(url, headers=headers)
+
+        # cached copy still valid
+        if res.status_code == 304:
+            logger.debug(f"revalidated cached {url}")
+            Metrics().add("image.fetch", hits=1)
+            content = cached
+
+        elif res.ok:
+            cache.put(url, res.content, res.headers)
+            Metrics().add("image.fetch", misses=1, bytes=len(res.content))
+            content = res.content
+
+        else:
+            Metrics().add("image.fetch", missing=1)
+            content = None
+
+        with ImageLoader.__lock:
+            if content is None:
+                ImageLoader.__missing.add(url)
+            else:
+                ImageLoader.__validated.add(url)
+
+        # remember for later runs, other errors may be temporary
+        if content is not None or res.status_code in ImageLoader._MISSING_STATUS:
+            cache.set_missing(url, content is None)
+
+        return content
+
     @classmethod
-    def _load_inner(cls, url_parts: tuple[str, str, str]) -> Image.Image:
+    def _fetch_source(cls, url_parts: tuple[str, str, str]) -> bytes:
         logger = logging.getLogger(__name__)
         base_url, code, lang_suffix = url_parts
 
@@ -21,26 +107,86 @@ class ImageLoader:
         url = base_url.format(code, lang_suffix)
         logger.info(f"trying image {url}")
 
-        # fetch image (retry on fail)
-        while True:
-            try:
-                res = requests.get(url, stream=True)
-                break
-
-            except requests.RequestException:
-                pass
-
         # if rejected, substitute the english version
-        if not res.ok:
+        if (content := cls._fetch(url)) is None:
+            fallback_url = base_url.format(code, FALLBACK_LANGUAGE.image_suffix)
             logger.warning(f"falling back to english version of {url}")
-            return cls._load_inner((base_url, code, FALLBACK_LANGUAGE.image_suffix))
 
-        # unify images
-        image = Image.open(res.raw)
-        image.convert(mode="RGB")
-        return image.resize(RESOLUTION, Image.BICUBIC)
+            if fallback_url == url or (content := cls._fetch(fallback_url)) is None:
+                raise FetchError(f"Couldn't load image {url}: not found!")
+
+        return content
+
+    @classmethod
+    def _fetch_digest(cls, url_parts: tuple[str, str, str]) -> tuple[bytes, str]:
+        content = cls._fetch_source(url_parts)
+        return content, hashlib.sha1(content).hexdigest()
 
     @classmethod
-    def load(cls, urls_parts: list[tuple[str, str, str]], num_threads: int) -> list[Image.Image]:
-        with multiprocessing.Pool(num_threads) as p:
-            return p.map(cls._load_inner, urls_parts)
+    def _load_inner(cls, source: tuple[bytes, str], resample: Image.Resampling,
+                    resolution: Grid, tile_group: Optional[str]) -> Image.Image:
+        content, digest = source
+        store = TileStore()
+
+        # same source content, same tile
+        if store.enabled and (image := store.get(digest, resolution, resample.name.lower())) is not None:
+            Metrics().add("image.tiles", hits=1)
+            return image
+
+        with Metrics().stage("image.decode"):
+            # JPEG: let the decoder scale down to at least the resolution, much cheaper than a full decode
+            image = Image.open(io.BytesIO(content))
+            image.draft("RGB", resolution)
+
+            # unify images
+            image = image.convert(mode="RGB").resize(resolution, resample)
+
+        if store.enabled:
+            Metrics().add("image.tiles", misses=1)
+            if tile_group is not None:
+                store.put(tile_group, digest, image, resample.name.lower())
+
+        return image
+
+    @classmethod
+    def prefetch(cls, urls_parts: list[tuple[str, str, str]], executor: Executor) -> list[Future[tuple[bytes, str]]]:
+        # get source images (revalidating cached ones) without decoding them, along with their digests
+        return [executor.submit(cls._fetch_digest, url_parts) for url_parts in urls_parts]
+
+    @classmethod
+    def load(cls, sources: Iterable[tuple[bytes, str]], num_threads: int,
+             max_in_flight: int = 0, executor: Optional[Executor] = None,
+             resample: Image.Resampling = Image.Resampling.BICUBIC,
+             resolution: Grid = RESOLUTION, tile_group: Optional[str] = None) -> Iterator[Image.Image]:
+        # never hold more than this many images not yet consumed
+        max_in_flight = max(num_threads, max_in_flight)
+        pending = collections.deque()
+
+        try:
+            with contextlib.ExitStack() as stack:
+                # use a shared download pool if given
+                if executor is None:
+                    executor = stack.enter_context(ThreadPoolExecutor(num_threads))
+
+                # prefetched source images
+                for source in sources:
+                    # backpressure: wait for the oldest image to be consumed
+                    if len(pending) >= max_in_flight:
+                        yield pending.popleft().result()
+
+                    # decoded images are kept as tiles of tile_group, if given
+                    pending.append(executor.submit(cls._load_inner, source, resample, resolution, tile_group))
+
+                # yields images in order as soon as they are available
+                while pending:
+                    yield pending.popleft().result()
+
+        finally:
+            # stopped early: don't decode images no longer needed
+            for future in pending:
+                future.cancel()
+
+            ImageCache().flush()
+            ImageCache().evict()
+            TileStore().flush()
+            TileStore().evict()
@@ -2,6 +2,9 @@ from __future__ import annotations
 
 from dataclasses import dataclass, InitVar, field
 
+# supported languages, in ordinal order
+_SHORTS = ("de", "en", "es", "fr", "it", "ja")
+
 
 @dataclass(frozen=True)
 class Language:
@@ -12,12 +15,17 @@ class Language:
         short_init = short_init.lower()
 
         # supported languages
-        if short_init in ["de", "es", "fr", "ja", "it"]:
+        if short_init in _SHORTS:
             object.__setattr__(self, "short", short_init)
         else:
             # everything else is english
             object.__setattr__(self, "short", "en")
 
+    @property
+    def ordinal(self) -> int:
+        # position in per-language sequences
+        return _SHORTS.index(self.short)
+
     @property
     def image_suffix(self) -> str:
         # supported languages for face URLs
@@ -39,7 +47,7 @@ class Language:
 
 API_LANGS = frozenset([
     Language(short)
-    for short in ["de", "en", "es", "fr", "it", "ja"]
+    for short in _SHORTS
 ])
 
 IMG_LANGS = frozenset([
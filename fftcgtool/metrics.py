@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import contextlib
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from os import PathLike
+from typing import Any, ContextManager, Iterator, Optional
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+class Metrics:
+    _instance: Metrics = None
+    _enabled: bool = False
+    _profile: bool = False
+    _trace_memory: bool = False
+    # stage name -> counter name -> total
+    _stages: dict[str, dict[str, float]] = {}
+    _profile_stats: Optional[pstats.Stats] = None
+    _started: float = 0
+    _cpu_started: float = 0
+
+    # number of allocation sites in the report
+    _TOP_ALLOCATIONS = 20
+
+    __local = threading.local()
+    __lock = threading.Lock()
+
+    def __new__(cls, *more) -> Metrics:
+        if Metrics._instance is None:
+            Metrics._instance = object.__new__(Metrics)
+
+        return Metrics._instance
+
+    def __init__(self, enabled: bool = None, profile: bool = False, trace_memory: bool = False):
+        if enabled is not None:
+            self._enabled = enabled
+            self._profile = profile
+            self._trace_memory = trace_memory
+            self._stages = {}
+            self._profile_stats = None
+            self._started = time.perf_counter()
+            self._cpu_started = time.process_time()
+
+            if trace_memory:
+                tracemalloc.start()
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def add(self, stage: str, **counters: float) -> None:
+        if not self._enabled:
+            return
+
+        with Metrics.__lock:
+            totals = self._stages.setdefault(stage, {})
+            for key, value in counters.items():
+                totals[key] = totals.get(key, 0) + value
+
+    def __start_profiler(self) -> Optional[cProfile.Profile]:
+        # only the outermost stage of a thread is profiled
+        if not self._profile or getattr(Metrics.__local, "profiling", False):
+            return None
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+
+        except ValueError:
+            # newer Pythons allow only one active profiler per process
+            return None
+
+        Metrics.__local.profiling = True
+        return profiler
+
+    def __stop_profiler(self, profiler: cProfile.Profile) -> None:
+        profiler.disable()
+        Metrics.__local.profiling = False
+
+        with Metrics.__lock:
+            if self._profile_stats is None:
+                self._profile_stats = pstats.Stats(profiler)
+            else:
+                self._profile_stats.add(profiler)
+
+    @contextlib.contextmanager
+    def __measure(self, stage: str) -> Iterator[None]:
+        profiler = self.__start_profiler()
+        wall, cpu = time.perf_counter(), time.thread_time()
+
+        try:
+            yield
+
+        finally:
+            # times of nested stages are included
+            self.add(stage, count=1, wall=time.perf_counter() - wall, cpu=time.thread_time() - cpu)
+
+            if profiler is not None:
+                self.__stop_profiler(profiler)
+
+    def stage(self, stage: str) -> ContextManager[None]:
+        # wall and CPU time of the current thread spent in a block
+        if not self._enabled:
+            return contextlib.nullcontext()
+
+        return self.__measure(stage)
+
+    def report(self) -> dict[str, Any]:
+        with Metrics.__lock:
+            stages = {
+                name: dict(counters)
+                for name, counters in sorted(self._stages.items())
+            }
+
+        for counters in stages.values():
+            if lookups := counters.get("hits", 0) + counters.get("misses", 0):
+                counters["hit_rate"] = counters.get("hits", 0) / lookups
+
+        report = {
+            "wall": time.perf_counter() - self._started,
+            "cpu": time.process_time() - self._cpu_started,
+            "stages": stages,
+        }
+
+        if resource is not None:
+            # kilobytes on Linux, bytes on macOS
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            report["peak_rss"] = peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+        if self._trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            statistics = tracemalloc.take_snapshot().statistics("lineno")
+
+            report["memory"] = {
+                "current": current,
+                "peak": peak,
+                "top": [
+                    {
+                        "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                        "size": stat.size,
+                        "count": stat.count,
+                    }
+                    for stat in statistics[:Metrics._TOP_ALLOCATIONS]
+                ],
+            }
+
+        return report
+
+    def write(self, path: str | PathLike[str]) -> None:
+        with open(path, "w") as file:
+            json.dump(self.report(), file, indent=2)
+
+    def dump_profile(self, path: str | PathLike[str]) -> None:
+        # readable with pstats or snakeviz
+        with Metrics.__lock:
+            if self._profile_stats is not None:
+                self._profile_stats.dump_stats(path)
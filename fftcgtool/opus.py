@@ -1,20 +1,21 @@
-import dataclasses
 import logging
-from typing import Callable, Iterable
+from typing import Iterable
 
-import requests
 import roman
 
 from .card import Card
 from .carddb import CardDB
 from .cards import Cards
-from .language import API_LANGS, Language
+from .code import Code
+from .fetcher import FetchError
+from .language import Language
+from .metrics import Metrics
+from .responsecache import ResponseCache
 from .ttsdeck import TTSDeck
+from .utils import SQUARE_API_URL
 
 
 class Opus(Cards):
-    __SQUARE_API_URL = "https://fftcg.square-enix-games.com/en/get-cards"
-
     def __init__(self, opus_id: str, language: Language):
         logger = logging.getLogger(__name__)
         self.__language = language
@@ -65,18 +66,22 @@ class Opus(Cards):
 
         # get cards from square api
         logger.debug(f"POST params: {params}")
-        req = requests.post(Opus.__SQUARE_API_URL, json=params)
-        carddb = CardDB()
-        cards = (
-            Card.from_square_api_data(card_data)
-            for card_data in req.json()["cards"]
-        )
-
-        cards = [
-            card
-            for card in cards
-            if card.code.opus == self.__number or not card.code.opus.isnumeric()
-        ]
+        if (data := ResponseCache().get_json("POST", SQUARE_API_URL, json=params)) is None:
+            raise FetchError(f"Square API rejected the request for {name}!")
+
+        with Metrics().stage("opus.parse"):
+            cards = (
+                Card.from_square_api_data(card_data)
+                for card_data in data["cards"]
+            )
+
+            cards = [
+                card
+                for card in cards
+                if card.code.opus == self.__number or not card.code.opus.isnumeric()
+            ]
+
+        Metrics().add("opus.parse", cards=len(cards))
 
         # remove reprints
         super().__init__(name, cards)
@@ -85,20 +90,18 @@ class Opus(Cards):
         self.sort(key=lambda x: x.code.serial)
         self.sort(key=lambda x: x.code.opus)
 
+        # faces of other languages are kept by CardDB.update
         for card in self:
-            try:
-                for lang in API_LANGS:
-                    card[lang] = dataclasses.replace(card[lang], face=carddb[card.code][lang].face)
-
-            except KeyError:
-                pass
-
             logger.debug(f"imported card {card}")
 
     @property
     def number(self) -> str:
         return self.__number
 
+    @property
+    def language(self) -> Language:
+        return self.__language
+
     @property
     def elemental_decks(self) -> Iterable[TTSDeck]:
         if self.number in ["PR", "B"]:
@@ -110,43 +113,42 @@ class Opus(Cards):
                 name=f"{self.name}",
                 description=f"All {self.name} Cards",
                 face_down=False,
+                language=self.__language,
             )]
 
         else:
-            def element_filter(element: str) -> Callable[[Card], list[str]]:
-                return lambda card: card.elements == [element]
+            carddb = CardDB()
+            codes = set([
+                card.code
+                for card in self
+            ])
 
-            # simple cases: create lambdas for base elemental decks
+            def query(**criteria) -> list[Code]:
+                return carddb.query(codes=codes, language=self.__language, **criteria)
+
+            # simple cases: base elemental decks
             base_elements = ["Fire", "Ice", "Wind", "Earth", "Lightning", "Water"]
-            filters = {
-                elem: element_filter(elem)
+            deck_codes = {
+                elem: query(elements=[elem])
                 for elem in base_elements
             }
 
-            filters |= {
+            deck_codes |= {
                 # light/darkness elemental deck
-                "Light-Darkness": lambda card: card.elements in (["Light"], ["Darkness"]),
+                "Light-Darkness": query(elements=["Darkness"]) + query(elements=["Light"]),
                 # multi element deck
-                "Multi": lambda card: "Crystal" in card.elements or len(card.elements) > 1,
+                "Multi": query(elements=["Crystal"]) + query(multi=True),
             }
 
-            # sort cards by element, then alphabetically
-            cards = list(self)
-            cards.sort(key=lambda x: x[self.__language].name)
-            cards.sort(key=lambda x: "Multi" if len(x.elements) > 1 else x.elements[0])
-
-            # generate decks
+            # generate decks (cards alphabetically within each element)
             decks = (
                 TTSDeck(
-                    codes=[
-                        card.code
-                        for card in cards
-                        if f(card)
-                    ],
+                    codes=elem_codes,
                     name=f"{self.name} {elem}",
                     description=f"All {self.name} Cards with {elem} element in alphabetical order",
                     face_down=False,
-                ) for elem, f in filters.items()
+                    language=self.__language,
+                ) for elem, elem_codes in deck_codes.items()
             )
 
             # Ignore empty decks
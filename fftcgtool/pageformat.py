@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+from PIL import Image
+
+
+@dataclass(frozen=True)
+class PageFormat:
+    codec: str = "jpeg"
+    quality: int = 75
+    optimize: bool = False
+    progressive: bool = False
+    subsampling: str = "4:2:0"
+    resample: str = "bicubic"
+
+    @property
+    def extension(self) -> str:
+        if self.codec == "png":
+            return "png"
+        elif self.codec == "webp":
+            return "webp"
+        else:
+            return "jpg"
+
+    @property
+    def resample_filter(self) -> Image.Resampling:
+        # filter for scaling card images and tiers
+        return Image.Resampling[self.resample.upper()]
+
+    @property
+    def save_params(self) -> dict[str, Any]:
+        # keyword arguments for Pillow's Image.save
+        if self.codec == "png":
+            return {
+                "format": "PNG",
+                "optimize": self.optimize,
+            }
+
+        elif self.codec == "webp":
+            return {
+                "format": "WEBP",
+                "quality": self.quality,
+                "method": 6 if self.optimize else 4,
+            }
+
+        else:
+            return {
+                "format": "JPEG",
+                "quality": self.quality,
+                "optimize": self.optimize,
+                "progressive": self.progressive,
+                "subsampling": self.subsampling,
+            }
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Optional
+
+from .utils import IMAGES_DIR_NAME
+
+
+class PageRegistry:
+    def __init__(self):
+        # page content key -> page file name
+        self.__pages: dict[str, str] = {}
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def __key(manifest: dict[str, Any]) -> Optional[str]:
+        # pages with the same sources look the same, whatever their language
+        content = {
+            key: value
+            for key, value in manifest.items()
+            if key != "language"
+        }
+
+        # unknown sources can't be compared
+        if content.get("back") is None or None in content.get("sources", [None]):
+            return None
+
+        return hashlib.sha1(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def scan(self) -> None:
+        # pages built in earlier runs
+        logger = logging.getLogger(__name__)
+
+        if not os.path.exists(IMAGES_DIR_NAME):
+            return
+
+        for entry in sorted(os.scandir(IMAGES_DIR_NAME), key=lambda e: e.name):
+            file_name = entry.name[:-len(".json")]
+            if not entry.name.endswith(".json") or not os.path.exists(os.path.join(IMAGES_DIR_NAME, file_name)):
+                continue
+
+            try:
+                with open(entry.path, "r") as file:
+                    self.register(json.load(file), file_name)
+
+            except ValueError:
+                logger.warning(f"Ignoring malformed page manifest {entry.path!r}")
+
+    def register(self, manifest: dict[str, Any], file_name: str) -> None:
+        if (key := PageRegistry.__key(manifest)) is not None:
+            with self.__lock:
+                # the first page with some content is shared
+                self.__pages.setdefault(key, file_name)
+
+    def find(self, manifest: dict[str, Any]) -> Optional[str]:
+        if (key := PageRegistry.__key(manifest)) is None:
+            return None
+
+        with self.__lock:
+            file_name = self.__pages.get(key)
+
+        # shared page must still exist
+        if file_name is not None and os.path.exists(os.path.join(IMAGES_DIR_NAME, file_name)):
+            return file_name
+
+        return None
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import time
+from os import PathLike
+from typing import Any, Optional
+
+from .fetcher import Fetcher, FetchError
+from .metrics import Metrics
+from .utils import RESPONSES_DIR_NAME, atomic_write
+
+
+class ResponseCache:
+    _instance: ResponseCache = None
+    _directory: Optional[str | PathLike[str]] = None
+    _ttl: float = 0
+    _offline: bool = False
+    _refresh: bool = False
+
+    def __new__(cls, *more) -> ResponseCache:
+        if ResponseCache._instance is None:
+            ResponseCache._instance = object.__new__(ResponseCache)
+
+        return ResponseCache._instance
+
+    def __init__(self, directory: str | PathLike[str] = None, ttl: float = 0,
+                 offline: bool = False, refresh: bool = False):
+        if directory is not None:
+            self._directory = os.path.join(directory, RESPONSES_DIR_NAME)
+            self._ttl = ttl
+            self._offline = offline
+            self._refresh = refresh
+
+            os.makedirs(self._directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self._directory is not None
+
+    @staticmethod
+    def __key(method: str, url: str, kwargs: dict[str, Any]) -> str:
+        # same request, regardless of parameter order
+        request = json.dumps({
+            "method": method.upper(),
+            "url": url,
+            "params": kwargs.get("params"),
+            "json": kwargs.get("json"),
+        }, sort_keys=True)
+
+        return hashlib.sha1(request.encode("utf-8")).hexdigest()
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.json")
+
+    def __read(self, key: str) -> Optional[dict[str, Any]]:
+        try:
+            with open(self.__path(key), "r") as file:
+                return json.load(file)
+
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def __write(self, key: str, entry: dict[str, Any]) -> None:
+        with atomic_write(self.__path(key), "w") as file:
+            json.dump(entry, file)
+
+    def get_json(self, method: str, url: str, **kwargs) -> Optional[Any]:
+        # decoded JSON response, None if the request was rejected
+        with Metrics().stage("api"):
+            return self.__get_json(method, url, **kwargs)
+
+    def __get_json(self, method: str, url: str, **kwargs) -> Optional[Any]:
+        logger = logging.getLogger(__name__)
+
+        if not self.enabled:
+            res = Fetcher().request(method, url, **kwargs)
+            return res.json() if res.ok else None
+
+        key = ResponseCache.__key(method, url, kwargs)
+        entry = self.__read(key)
+
+        if entry is not None:
+            if self._offline:
+                logger.debug(f"replaying cached {method} {url}")
+                Metrics().add("api", hits=1)
+                return entry["data"]
+
+            if not self._refresh and time.time() - entry["fetched"] < self._ttl:
+                logger.debug(f"using cached {method} {url}")
+                Metrics().add("api", hits=1)
+                return entry["data"]
+
+        elif self._offline:
+            raise FetchError(f"{method} {url} not cached, can't fetch while offline!")
+
+        Metrics().add("api", misses=1)
+        try:
+            res = Fetcher().request(method, url, **kwargs)
+
+        except FetchError as cause:
+            if entry is None:
+                raise
+
+            # better stale than nothing
+            logger.warning(f"using stale cached {method} {url}: {cause}")
+            Metrics().add("api", stale=1)
+            return entry["data"]
+
+        if not res.ok:
+            return None
+
+        data = res.json()
+        self.__write(key, {
+            "method": method.upper(),
+            "url": url,
+            "fetched": time.time(),
+            "data": data,
+        })
+
+        return data
@@ -1,12 +1,19 @@
 #!/usr/bin/env python3
+import functools
 import logging
 import os
+import re
 import sys
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, TextIO
+from urllib.parse import urlsplit
 
 import click
 
 import fftcgtool
+from fftcgtool.grid import Grid
+from fftcgtool.utils import CACHE_DIR_NAME, FFDECKS_API_URL, GRID, RESOLUTION
 
 
 class LanguageParamType(click.ParamType):
@@ -22,6 +29,52 @@ class LanguageParamType(click.ParamType):
 LANGUAGE = LanguageParamType()
 
 
+class SizeParamType(click.ParamType):
+    name = "size"
+
+    def __init__(self, max_size: Grid = None):
+        self.__max_size = max_size
+
+    def convert(self, value, param, ctx) -> Grid:
+        if isinstance(value, Grid):
+            return value
+
+        match = re.fullmatch(r"([0-9]+)x([0-9]+)", str(value))
+        if match is None:
+            self.fail(f"{value!r} is not of the form WIDTHxHEIGHT", param, ctx)
+
+        size = Grid((int(match.group(1)), int(match.group(2))))
+        if size.x < 1 or size.y < 1 or size.x * size.y < 2:
+            self.fail(f"{value!r} is too small", param, ctx)
+
+        if self.__max_size is not None and (size.x > self.__max_size.x or size.y > self.__max_size.y):
+            self.fail(f"{value!r} exceeds {self.__max_size.x}x{self.__max_size.y}", param, ctx)
+
+        return size
+
+
+class TierParamType(click.ParamType):
+    name = "tier"
+
+    def convert(self, value, param, ctx) -> tuple[str, float]:
+        if isinstance(value, tuple):
+            return value
+
+        match = re.fullmatch(r"(\w+)=([0-9.]+)", str(value))
+        if match is None:
+            self.fail(f"{value!r} is not of the form NAME=SCALE", param, ctx)
+
+        try:
+            scale = float(match.group(2))
+        except ValueError:
+            scale = 0
+
+        if not 0 < scale < 1:
+            self.fail(f"scale of {value!r} must be between 0 and 1", param, ctx)
+
+        return match.group(1), scale
+
+
 @click.group()
 @click.option(
     "-v", "--verbose",
@@ -37,10 +90,48 @@ LANGUAGE = LanguageParamType()
 )
 @click.option(
     "-z", "--zip",
-    type=click.File("wb"),
+    type=click.Path(
+        allow_dash=True,
+        dir_okay=False,
+        file_okay=True,
+    ),
     help="wrap deck files into a zip archive, skip creating individual JSONs",
     metavar="FILE",
 )
+@click.option(
+    "--compact",
+    is_flag=True,
+    help="write deck files without indentation",
+)
+@click.option(
+    "--grid",
+    # largest deck sheet TT-Sim supports
+    type=SizeParamType(max_size=GRID),
+    default=f"{GRID.x}x{GRID.y}",
+    help="number of card columns and rows on book pages",
+    metavar="COLSxROWS",
+)
+@click.option(
+    "--card-size",
+    type=SizeParamType(),
+    default=f"{RESOLUTION.x}x{RESOLUTION.y}",
+    help="size of each card on book pages in pixels",
+    metavar="WxH",
+)
+@click.option(
+    "--tier",
+    "tiers",
+    type=TierParamType(),
+    multiple=True,
+    help="also write book pages scaled down by SCALE, e.g. preview=0.5 for *_preview.jpg pages",
+    metavar="NAME=SCALE",
+)
+@click.option(
+    "--deck-tier",
+    type=str,
+    help="use the book pages of this --tier in decks",
+    metavar="NAME",
+)
 @click.option(
     "-o", "--output",
     type=click.Path(
@@ -66,15 +157,122 @@ LANGUAGE = LanguageParamType()
         file_okay=True,
     ),
     default="carddb.zip",
-    help="use specified CardDB file instead of ./out/carddb.zip",
+    help="use specified CardDB file instead of ./out/carddb.zip, use a .sqlite file for faster lookups",
+    metavar="FILE",
+)
+@click.option(
+    "-c", "--cache-dir",
+    type=click.Path(
+        allow_dash=False,
+        dir_okay=True,
+        file_okay=False,
+    ),
+    default=CACHE_DIR_NAME,
+    help="use specified cache directory instead of ./out/cache",
+    metavar="DIR",
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=0),
+    default=2048,
+    help="maximum size of the image cache in MiB, 0 for unlimited",
+    metavar="MIB",
+)
+@click.option(
+    "--tile-store-size",
+    type=click.IntRange(min=0),
+    default=0,
+    help="maximum size of decoded card images kept for rebuilding pages in MiB, 0 to disable",
+    metavar="MIB",
+)
+@click.option(
+    "--missing-ttl",
+    type=click.FloatRange(min=0),
+    default=168,
+    help="don't request card images missing on the CDN again for this many hours",
+    metavar="HOURS",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=5,
+    help="maximum number of retries per request",
+    metavar="N",
+)
+@click.option(
+    "--retry-budget",
+    type=click.IntRange(min=0),
+    default=100,
+    help="maximum number of retries per run",
+    metavar="N",
+)
+@click.option(
+    "--response-ttl",
+    type=click.FloatRange(min=0),
+    default=24,
+    help="reuse cached API responses for this many hours",
+    metavar="HOURS",
+)
+@click.option(
+    "--offline",
+    is_flag=True,
+    help="never access the network, only use cached content",
+)
+@click.option(
+    "--refresh",
+    is_flag=True,
+    help="fetch API responses again, even if cached",
+)
+@click.option(
+    "--metrics",
+    type=click.Path(
+        allow_dash=False,
+        dir_okay=False,
+        file_okay=True,
+    ),
+    help="write per-stage timings and counters as JSON",
     metavar="FILE",
 )
+@click.option(
+    "--profile",
+    type=click.Path(
+        allow_dash=False,
+        dir_okay=False,
+        file_okay=True,
+    ),
+    help="write cProfile stats of all measured stages",
+    metavar="FILE",
+)
+@click.option(
+    "--trace-memory",
+    is_flag=True,
+    help="add allocation statistics to the metrics, slows down everything",
+)
 @click.pass_context
 def main(ctx, **kwargs) -> None:
     """Imports FFTCG cards for TT-Sim."""
 
     ctx.ensure_object(dict)
     ctx.obj["language"] = kwargs["language"]
+    ctx.obj["compact"] = kwargs["compact"]
+    ctx.obj["grid"] = kwargs["grid"]
+    ctx.obj["card_size"] = kwargs["card_size"]
+    ctx.obj["tiers"] = dict(kwargs["tiers"])
+    ctx.obj["deck_tier"] = kwargs["deck_tier"]
+    # set if some Opuses or Decks couldn't be imported
+    ctx.obj["failed"] = False
+
+    # decks can't use pages that are never written
+    if kwargs["deck_tier"] is not None and kwargs["deck_tier"] not in ctx.obj["tiers"]:
+        raise click.BadParameter(f"{kwargs['deck_tier']!r} is none of the --tier names", param_hint="--deck-tier")
+
+    # deck zip file, relative to the working directory
+    if kwargs["zip"] == "-":
+        ctx.obj["zip"] = sys.stdout.buffer
+    elif kwargs["zip"] is not None:
+        ctx.obj["zip"] = os.path.abspath(kwargs["zip"])
+    else:
+        ctx.obj["zip"] = None
 
     # set up logging
     if kwargs["verbose"] == 0:
@@ -86,19 +284,43 @@ def main(ctx, **kwargs) -> None:
 
     logging.basicConfig(
         level=log_level,
-        format="%(levelname)s in %(name)s (#%(process)d): %(message)s",
+        format="%(levelname)s in %(name)s (%(threadName)s): %(message)s",
     )
 
     logger = logging.getLogger(__name__)
     logger.info("fftcgtool started.")
     logger.debug(f"{kwargs = }")
 
+    # set up metrics, reports are written even if the run fails
+    if kwargs["metrics"] is not None or kwargs["profile"] is not None:
+        metrics = fftcgtool.Metrics(True, kwargs["profile"] is not None,
+                                    kwargs["trace_memory"] and kwargs["metrics"] is not None)
+
+        # relative to the working directory
+        if kwargs["metrics"] is not None:
+            ctx.call_on_close(functools.partial(metrics.write, os.path.abspath(kwargs["metrics"])))
+        if kwargs["profile"] is not None:
+            ctx.call_on_close(functools.partial(metrics.dump_profile, os.path.abspath(kwargs["profile"])))
+
     # output directory
     if not os.path.exists(kwargs["output"]):
         os.mkdir(kwargs["output"])
 
     os.chdir(kwargs["output"])
 
+    # set up network access
+    fftcgtool.Fetcher(kwargs["retries"], kwargs["retry_budget"])
+
+    # set up the image cache
+    fftcgtool.ImageCache(kwargs["cache_dir"], kwargs["cache_size"] * 1024 * 1024, kwargs["offline"],
+                         kwargs["missing_ttl"] * 3600)
+
+    # set up the decoded card image store
+    fftcgtool.TileStore(kwargs["cache_dir"], kwargs["tile_store_size"] * 1024 * 1024)
+
+    # set up the API response cache
+    fftcgtool.ResponseCache(kwargs["cache_dir"], kwargs["response_ttl"] * 3600, kwargs["offline"], kwargs["refresh"])
+
     # load the current carddb
     if kwargs["db_url"] is not None:
         try:
@@ -119,6 +341,73 @@ def main(ctx, **kwargs) -> None:
     default=20,
     help="maximum number of concurrent requests",
 )
+@click.option(
+    "-j", "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    help="maximum number of Opuses imported concurrently",
+    metavar="N",
+)
+@click.option(
+    "-L", "--languages",
+    type=LANGUAGE,
+    multiple=True,
+    help="build for each of these languages instead, sharing identical pages (repeatable)",
+    metavar="LANG",
+)
+@click.option(
+    "-m", "--max-memory",
+    type=click.IntRange(min=0),
+    default=512,
+    help="maximum memory for downloaded card images and pages being built in MiB",
+    metavar="MIB",
+)
+@click.option(
+    "-e", "--num-encoders",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    help="maximum number of pages encoded in parallel",
+    metavar="N",
+)
+@click.option(
+    "--format", "codec",
+    type=click.Choice(["jpeg", "webp", "png"], case_sensitive=False),
+    default="jpeg",
+    help="image format for book pages",
+)
+@click.option(
+    "--quality",
+    type=click.IntRange(min=1, max=100),
+    default=75,
+    help="JPEG/WebP quality for book pages",
+)
+@click.option(
+    "--optimize/--no-optimize",
+    default=False,
+    help="spend more time on smaller book pages",
+)
+@click.option(
+    "--progressive/--no-progressive",
+    default=False,
+    help="write progressive JPEG book pages",
+)
+@click.option(
+    "--subsampling",
+    type=click.Choice(["4:4:4", "4:2:2", "4:2:0"]),
+    default="4:2:0",
+    help="JPEG chroma subsampling for book pages",
+)
+@click.option(
+    "--resample",
+    type=click.Choice(["nearest", "bilinear", "bicubic", "lanczos"], case_sensitive=False),
+    default="bicubic",
+    help="filter for scaling card images",
+)
+@click.option(
+    "--full-rebuild",
+    is_flag=True,
+    help="rebuild all book pages, even if unchanged",
+)
 @click.argument(
     "opus-ids",
     nargs=-1,
@@ -126,7 +415,8 @@ def main(ctx, **kwargs) -> None:
     metavar="[OPUS-ID] ...",
 )
 @click.pass_context
-def opuses(ctx, opus_ids: list[str], num_requests: int) -> list[fftcgtool.TTSDeck]:
+def opuses(ctx, opus_ids: list[str], num_requests: int, jobs: int, languages: list[fftcgtool.Language],
+           max_memory: int, num_encoders: int, **kwargs) -> list[fftcgtool.TTSDeck]:
     """
     Imports Opuses from the square API and creates its elemental decks as JSON files.
 
@@ -134,20 +424,70 @@ def opuses(ctx, opus_ids: list[str], num_requests: int) -> list[fftcgtool.TTSDec
     """
 
     ctx.ensure_object(dict)
-    language = ctx.obj["language"] or fftcgtool.Language("")
+    # unique languages, in given order
+    languages = list(dict.fromkeys(languages)) or [ctx.obj["language"] or fftcgtool.Language("")]
+
+    logger = logging.getLogger(__name__)
 
+    page_format = fftcgtool.PageFormat(
+        codec=kwargs["codec"].lower(),
+        quality=kwargs["quality"],
+        optimize=kwargs["optimize"],
+        progressive=kwargs["progressive"],
+        subsampling=kwargs["subsampling"],
+        resample=kwargs["resample"].lower(),
+    )
+
+    # pages for reuse across languages
+    registry = None
+    if len(languages) > 1:
+        registry = fftcgtool.PageRegistry()
+        if not kwargs["full_rebuild"]:
+            registry.scan()
+
+    with ThreadPoolExecutor(num_requests, thread_name_prefix="download") as downloads, \
+            ThreadPoolExecutor(jobs, thread_name_prefix="opus") as importer:
+
+        def import_opus(opus_id: str) -> list[tuple[fftcgtool.Opus, fftcgtool.Book]]:
+            # import an opus, concurrent Opuses share the memory limit and download pool
+            results = []
+
+            # one language after another, so later languages can reuse pages
+            for language in languages:
+                opus = fftcgtool.Opus(opus_id, language)
+                book = fftcgtool.Book(opus, language, num_requests, max_memory * 1024 * 1024 // jobs,
+                                      page_format, num_encoders, not kwargs["full_rebuild"], downloads, registry,
+                                      grid=ctx.obj["grid"], resolution=ctx.obj["card_size"], tiers=ctx.obj["tiers"])
+                book.save()
+                results.append((opus, book))
+
+            return results
+
+        imports = [
+            (opus_id, importer.submit(import_opus, opus_id))
+            for opus_id in opus_ids
+        ]
+
+        imported: list[tuple[fftcgtool.Opus, fftcgtool.Book]] = []
+        for opus_id, future in imports:
+            try:
+                imported.extend(future.result())
+
+            except fftcgtool.FetchError as cause:
+                # keep the other Opuses, but exit with an error in the end
+                logger.error(f"Couldn't import Opus {opus_id!r}: {cause}")
+                ctx.obj["failed"] = True
+
+    # merge into CardDB in the given order
     carddb = fftcgtool.CardDB()
     decks: list[fftcgtool.TTSDeck] = []
-    for opus_id in opus_ids:
-        # import an opus
-        opus = fftcgtool.Opus(opus_id, language)
-        book = fftcgtool.Book(opus, language, num_requests)
-        book.save()
-
+    for opus, book in imported:
         carddb.update(opus)
+        carddb.set_face_grid(set(face for face, _ in book.layout.values()), ctx.obj["grid"])
+        carddb.invalidate_faces(book.rebuilt_faces)
         decks.extend(opus.elemental_decks)
 
-    carddb.upload_prompt()
+    carddb.upload_prompt(ctx.obj["tiers"])
     carddb.save()
 
     # create elemental decks for opus
@@ -155,50 +495,187 @@ def opuses(ctx, opus_ids: list[str], num_requests: int) -> list[fftcgtool.TTSDec
 
 
 @main.command()
+@click.option(
+    "-n", "--num-requests",
+    type=click.IntRange(min=1),
+    default=8,
+    help="maximum number of concurrent requests",
+)
+@click.option(
+    "-i", "--input", "input_file",
+    type=click.File("r"),
+    help="also import Decks listed in FILE, one ID or URL per line, '-' for stdin",
+    metavar="FILE",
+)
+@click.option(
+    "--checkpoint",
+    type=click.Path(
+        allow_dash=False,
+        dir_okay=False,
+        file_okay=True,
+    ),
+    help="record finished Decks in FILE and skip them when run again",
+    metavar="FILE",
+)
+@click.option(
+    "--rate-limit",
+    type=click.FloatRange(min=0),
+    default=5,
+    help="maximum number of requests per second to ffdecks.com, 0 for unlimited",
+    metavar="RPS",
+)
+@click.option(
+    "--atlas",
+    is_flag=True,
+    help="put each Deck's cards onto pages of its own, instead of using whole Opus pages",
+)
+@click.option(
+    "--atlas-url",
+    type=str,
+    default="",
+    help="URL prefix where the Deck pages will be uploaded, required with --atlas",
+    metavar="URL",
+)
 @click.argument(
     "deck-ids",
     nargs=-1,
     type=str,
     metavar="[DECK-ID] ...",
 )
-def ffdecks(deck_ids: list[str]) -> list[fftcgtool.TTSDeck]:
+@click.pass_context
+def ffdecks(ctx, deck_ids: list[str], num_requests: int, input_file: Optional[TextIO], checkpoint: Optional[str],
+            rate_limit: float, atlas: bool, atlas_url: str) -> list[fftcgtool.TTSDeck]:
     """
     Imports Decks from the ffdecks.com API and creates it as a JSON file.
 
     DECK_ID: each of the Decks to import
+
+    Paths are relative to the output directory.
     """
 
-    return fftcgtool.FFDecks(deck_ids)
+    ctx.ensure_object(dict)
+    logger = logging.getLogger(__name__)
+
+    # Deck pages aren't in the CardDB, so their URLs can't be looked up
+    if atlas and not atlas_url:
+        raise click.UsageError("--atlas requires --atlas-url")
+
+    fftcgtool.Fetcher().limit_rate(urlsplit(FFDECKS_API_URL).hostname, rate_limit)
+
+    deck_ids = list(deck_ids)
+    if input_file is not None:
+        deck_ids.extend(
+            line.strip()
+            for line in input_file
+            if line.strip() and not line.lstrip().startswith("#")
+        )
+
+    with fftcgtool.Checkpoint(checkpoint) as done:
+        # skip Decks finished in an earlier run
+        todo = [
+            deck_id
+            for deck_id, sanitized_id in zip(deck_ids, fftcgtool.FFDecks.sanitized_ids(deck_ids))
+            if sanitized_id not in done
+        ]
+
+        if done.resuming:
+            logger.info(f"Resuming, {len(deck_ids) - len(todo)} Decks already done")
+
+        # write each Deck as soon as it is built
+        with fftcgtool.DeckWriter(ctx.obj["language"], ctx.obj["compact"], ctx.obj["zip"], done.resuming,
+                                  ctx.obj["grid"], ctx.obj["deck_tier"]) as writer:
+            # failed Decks are skipped, and not recorded as done
+            failed = []
+
+            for deck_id, deck in fftcgtool.FFDecks.iter_decks(todo, num_requests, failed):
+                if deck is not None:
+                    if atlas:
+                        try:
+                            # pages with just the cards needed, not modifying the CardDB
+                            book = fftcgtool.Book(deck.atlas_cards, deck.language or ctx.obj["language"],
+                                                  num_requests, assign_faces=False, grid=ctx.obj["grid"],
+                                                  resolution=ctx.obj["card_size"], tiers=ctx.obj["tiers"])
+                            book.save()
+
+                        except fftcgtool.FetchError as cause:
+                            logger.error(f"Couldn't build pages for Deck '{deck_id}': {cause}")
+                            failed.append(deck_id)
+                            continue
+
+                        deck.use_layout(book.layout, atlas_url)
+
+                    writer.write(deck)
+
+                done.add(deck_id)
+
+            if failed:
+                logger.error(f"Couldn't import {len(failed)} Decks, run again to retry")
+                ctx.obj["failed"] = True
+
+    return []
+
+
+@main.command()
+@click.argument(
+    "source",
+    type=click.Path(
+        exists=True,
+        allow_dash=False,
+        dir_okay=False,
+        file_okay=True,
+    ),
+)
+def migrate(source: str) -> list[fftcgtool.TTSDeck]:
+    """
+    Imports all cards from a CardDB zip file into the current CardDB, e.g. to convert it to SQLite.
+
+    SOURCE: CardDB zip file to import, relative to the output directory
+    """
+
+    carddb = fftcgtool.CardDB()
+    carddb.migrate(source)
+    carddb.save()
+
+    return []
+
+
+@main.command()
+def compact() -> list[fftcgtool.TTSDeck]:
+    """
+    Folds the changes saved in the CardDB journal into the CardDB zip file, e.g. before publishing it.
+    """
+
+    carddb = fftcgtool.CardDB()
+    carddb.compact()
+
+    return []
 
 
 @main.result_callback()
-def finalize(decks: list[fftcgtool.TTSDeck], **kwargs):
+@click.pass_context
+def finalize(ctx, decks: list[fftcgtool.TTSDeck], **kwargs):
     logger = logging.getLogger(__name__)
 
     # decide what to do with the decks
-    if kwargs["zip"] is not None:
+    if ctx.obj["zip"] is not None:
         logger.debug("Outputting decks to ZIP")
-
-        if decks:
-            # create zip file
-            with zipfile.ZipFile(kwargs["zip"], "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
-                # put the decks into that zip file
-                for deck in decks:
-                    logger.debug(f"Saving Deck {deck!r}")
-                    zip_file.writestr(deck.file_name, deck.get_json(kwargs["language"]))
-
     else:
         logger.debug("Outputting decks to disk")
 
-        # save the decks to disk
+    with fftcgtool.DeckWriter(ctx.obj["language"], ctx.obj["compact"], ctx.obj["zip"],
+                              grid=ctx.obj["grid"], tier=ctx.obj["deck_tier"]) as writer:
         for deck in decks:
-            logger.debug(f"Saving Deck {deck!r}")
-            deck.save(kwargs["language"])
+            writer.write(deck)
 
+    if ctx.obj["zip"] is None:
         # bye
         print("Done. Put the generated JSON files in your 'Saved Objects' Folder.")
         print("Thanks for using fftcgtool!")
 
+    # everything else was saved
+    if ctx.obj["failed"]:
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import pathlib
+import pickle
+import sqlite3
+import threading
+from os import PathLike
+from typing import Any, Callable, Iterator, MutableMapping
+
+from .code import Code
+
+_SQLITE_MAGIC = b"SQLite format 3\x00"
+
+
+def is_sqlite(header: bytes) -> bool:
+    return header.startswith(_SQLITE_MAGIC)
+
+
+# mapping backed by a key-value table, reading entries only on demand
+class _Table(MutableMapping):
+    def __init__(self, db: SQLiteDB, table: str,
+                 dump_key: Callable[[Any], str], load_key: Callable[[str], Any],
+                 dump_value: Callable[[Any], Any], load_value: Callable[[Any], Any]):
+        self.__db = db
+        self.__table = table
+        self.__dump_key, self.__load_key = dump_key, load_key
+        self.__dump_value, self.__load_value = dump_value, load_value
+        # entries already read or written
+        self.__memo: dict[str, Any] = {}
+        # entries not yet written
+        self.__dirty: set[str] = set()
+
+    def __getitem__(self, key: Any) -> Any:
+        db_key = self.__dump_key(key)
+        try:
+            return self.__memo[db_key]
+
+        except KeyError:
+            rows = self.__db.fetch(f"SELECT value FROM {self.__table} WHERE key = ?", (db_key,))
+
+            if not rows:
+                raise KeyError(key)
+
+            value = self.__memo[db_key] = self.__load_value(rows[0][0])
+            return value
+
+    def __contains__(self, key: Any) -> bool:
+        db_key = self.__dump_key(key)
+        if db_key in self.__memo:
+            return True
+
+        return bool(self.__db.fetch(f"SELECT 1 FROM {self.__table} WHERE key = ?", (db_key,)))
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        # values may still change, so they are only written on flush
+        db_key = self.__dump_key(key)
+        self.__memo[db_key] = value
+        self.__dirty.add(db_key)
+
+    def __delitem__(self, key: Any) -> None:
+        db_key = self.__dump_key(key)
+        known = self.__memo.pop(db_key, None) is not None
+        self.__dirty.discard(db_key)
+
+        if self.__db.execute(f"DELETE FROM {self.__table} WHERE key = ?", (db_key,)) == 0 and not known:
+            raise KeyError(key)
+
+    def flush(self) -> None:
+        for db_key in self.__dirty:
+            self.__db.execute(
+                f"INSERT OR REPLACE INTO {self.__table} (key, value) VALUES (?, ?)",
+                (db_key, self.__dump_value(self.__memo[db_key])),
+            )
+
+        self.__dirty.clear()
+
+    def __iter__(self) -> Iterator[Any]:
+        self.flush()
+        keys = self.__db.fetch(f"SELECT key FROM {self.__table} ORDER BY key")
+        return (self.__load_key(key) for key, in keys)
+
+    def __len__(self) -> int:
+        self.flush()
+        return self.__db.fetch(f"SELECT COUNT(*) FROM {self.__table}")[0][0]
+
+
+# CardDB storage in an SQLite file, so single cards can be read without loading everything
+class SQLiteDB:
+    def __init__(self, path: str | PathLike[str], read_only: bool = False):
+        if read_only:
+            # quotes characters like "?" or "#" in the path
+            uri = f"{pathlib.Path(path).absolute().as_uri()}?mode=ro"
+            self.__conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self.__conn = sqlite3.connect(path, check_same_thread=False)
+
+        self.__lock = threading.Lock()
+
+        if not read_only:
+            with self.__conn:
+                for table in ("cards", "face_to_url", "meta"):
+                    self.__conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value)")
+
+        self.cards = _Table(
+            self, "cards",
+            lambda code: code.short, Code,
+            pickle.dumps, pickle.loads,
+        )
+
+        self.face_to_url = _Table(
+            self, "face_to_url",
+            str, str,
+            str, str,
+        )
+
+        self.meta = _Table(
+            self, "meta",
+            str, str,
+            pickle.dumps, pickle.loads,
+        )
+
+    # the connection is shared between threads
+    def fetch(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self.__lock:
+            return self.__conn.execute(sql, params).fetchall()
+
+    def execute(self, sql: str, params: tuple = ()) -> int:
+        with self.__lock:
+            return self.__conn.execute(sql, params).rowcount
+
+    def commit(self) -> None:
+        self.cards.flush()
+        self.face_to_url.flush()
+        self.meta.flush()
+
+        with self.__lock:
+            self.__conn.commit()
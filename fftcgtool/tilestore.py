@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import mmap
+import os
+import threading
+from os import PathLike
+from typing import BinaryIO, Iterator, Optional
+
+from PIL import Image
+
+from .grid import Grid
+from .utils import TILES_DIR_NAME, atomic_write
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows
+    fcntl = None
+
+
+class TileStore:
+    _instance: TileStore = None
+    _directory: Optional[str | PathLike[str]] = None
+    _max_size: int = 0
+    # (width, height, resample) -> source digest -> (data file, slot)
+    _tiles: dict[tuple[int, int, str], dict[str, tuple[str, int]]] = {}
+    # data file -> inode the known tiles belong to
+    _inodes: dict[str, int] = {}
+    # data files used in this run
+    _used: set[str] = set()
+    _maps: dict[str, mmap.mmap] = {}
+
+    _DATA_SUFFIX = ".rgb"
+    _INDEX_SUFFIX = ".json"
+
+    __lock = threading.Lock()
+
+    def __new__(cls, *more) -> TileStore:
+        if TileStore._instance is None:
+            TileStore._instance = object.__new__(TileStore)
+
+        return TileStore._instance
+
+    def __init__(self, directory: str | PathLike[str] = None, max_size: int = 0):
+        if directory is not None:
+            self._directory = os.path.join(directory, TILES_DIR_NAME)
+            self._max_size = max_size
+            self._tiles, self._inodes, self._used, self._maps = {}, {}, set(), {}
+
+            if self.enabled:
+                os.makedirs(self._directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self._directory is not None and self._max_size > 0
+
+    @staticmethod
+    def __suffix(resolution: Grid, resample: str) -> str:
+        # tiles of one size per data file
+        return f"_{resolution.x}x{resolution.y}_{resample}{TileStore._DATA_SUFFIX}"
+
+    def __data_path(self, data_file: str) -> str:
+        return os.path.join(self._directory, data_file)
+
+    def __index_path(self, data_file: str) -> str:
+        return self.__data_path(data_file[:-len(TileStore._DATA_SUFFIX)] + TileStore._INDEX_SUFFIX)
+
+    @contextlib.contextmanager
+    def __locked(self, data_file: str, exclusive: bool = True) -> Iterator[BinaryIO]:
+        # data file locked against other processes sharing the store
+        path = self.__data_path(data_file)
+
+        while True:
+            file = open(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+
+            try:
+                if fcntl is not None:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+                try:
+                    current = os.stat(path).st_ino == os.fstat(file.fileno()).st_ino
+                except FileNotFoundError:
+                    current = False
+
+                # otherwise evicted while waiting for the lock
+                if current:
+                    yield file
+                    return
+
+            finally:
+                # also releases the lock
+                file.close()
+
+    def __read_index(self, data_file: str) -> dict[str, int]:
+        try:
+            with open(self.__index_path(data_file), "r") as file:
+                return json.load(file)
+
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def __merge_index(self, data_file: str, file: BinaryIO, tiles: dict[str, tuple[str, int]]) -> dict[str, int]:
+        # take tiles of a data file as on disk, caller holds both locks
+        index = self.__read_index(data_file)
+
+        for digest in [digest for digest, (tile_file, _) in tiles.items() if tile_file == data_file]:
+            del tiles[digest]
+
+        for digest, slot in index.items():
+            tiles.setdefault(digest, (data_file, slot))
+
+        self._inodes[data_file] = os.fstat(file.fileno()).st_ino
+        return index
+
+    def __load_tiles(self, resolution: Grid, resample: str) -> dict[str, tuple[str, int]]:
+        # read all indices for a tile size on first use, caller holds the lock
+        key = resolution.x, resolution.y, resample
+        if key in self._tiles:
+            return self._tiles[key]
+
+        suffix = TileStore.__suffix(resolution, resample)
+        tiles = self._tiles[key] = {}
+
+        for entry in os.scandir(self._directory):
+            if entry.name.endswith(suffix):
+                with self.__locked(entry.name, exclusive=False) as file:
+                    self.__merge_index(entry.name, file, tiles)
+
+        return tiles
+
+    def __map(self, data_file: str, end: int) -> Optional[mmap.mmap]:
+        # map the data file, again if it grew since
+        mapped = self._maps.get(data_file)
+        if mapped is not None and len(mapped) >= end:
+            return mapped
+
+        try:
+            with open(self.__data_path(data_file), "rb") as file:
+                stat = os.fstat(file.fileno())
+
+                # replaced since its tiles were read
+                if stat.st_ino != self._inodes.get(data_file) or stat.st_size < end:
+                    return None
+
+                # older mappings are closed once no longer read from
+                self._maps[data_file] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        except FileNotFoundError:
+            return None
+
+        return self._maps[data_file]
+
+    def get(self, digest: str, resolution: Grid, resample: str) -> Optional[Image.Image]:
+        # normalized card image for source content with that digest
+        if not self.enabled:
+            return None
+
+        tile_size = resolution.x * resolution.y * 3
+
+        with TileStore.__lock:
+            try:
+                data_file, slot = self.__load_tiles(resolution, resample)[digest]
+            except KeyError:
+                return None
+
+            start = slot * tile_size
+            if (mapped := self.__map(data_file, start + tile_size)) is None:
+                return None
+
+            self._used.add(data_file)
+
+        # copy straight from the mapping, no decoding
+        return Image.frombytes("RGB", resolution, mapped[start:start + tile_size])
+
+    def put(self, group: str, digest: str, image: Image.Image, resample: str) -> None:
+        if not self.enabled:
+            return
+
+        resolution = Grid(image.size)
+        data_file = f"{group}{TileStore.__suffix(resolution, resample)}"
+        tile_size = resolution.x * resolution.y * 3
+
+        with TileStore.__lock:
+            tiles = self.__load_tiles(resolution, resample)
+            if digest in tiles:
+                return
+
+            # other processes may have added tiles since
+            with self.__locked(data_file) as file:
+                index = self.__merge_index(data_file, file, tiles)
+                if digest in index:
+                    return
+
+                # orphaned bytes of interrupted runs are skipped
+                slot = -(-file.seek(0, os.SEEK_END) // tile_size)
+                file.seek(slot * tile_size)
+                file.write(image.tobytes())
+                file.flush()
+
+                # the index only ever refers to written tiles
+                index[digest] = slot
+                with atomic_write(self.__index_path(data_file), "w") as index_file:
+                    json.dump(index, index_file)
+
+            tiles[digest] = data_file, slot
+            self._used.add(data_file)
+
+    def flush(self) -> None:
+        if not self.enabled:
+            return
+
+        with TileStore.__lock:
+            # mark as recently used
+            for data_file in self._used:
+                try:
+                    os.utime(self.__data_path(data_file))
+                except FileNotFoundError:
+                    pass
+
+    def evict(self) -> None:
+        if not self.enabled:
+            return
+
+        logger = logging.getLogger(__name__)
+
+        with TileStore.__lock:
+            entries = []
+            for entry in os.scandir(self._directory):
+                if entry.name.endswith(TileStore._DATA_SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+
+                    # data files in use are kept
+                    last_used = float("inf") if entry.name in self._used else stat.st_mtime
+                    entries.append((last_used, stat.st_size, entry.name))
+
+            total_size = sum(size for _, size, _ in entries)
+
+            # drop least recently used data files first
+            entries.sort()
+            for last_used, size, data_file in entries:
+                if total_size <= self._max_size or last_used == float("inf"):
+                    break
+
+                # not while another process adds to it
+                with self.__locked(data_file):
+                    for path in (self.__data_path(data_file), self.__index_path(data_file)):
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            pass
+
+                # forget its tiles
+                self._inodes.pop(data_file, None)
+                self._maps.pop(data_file, None)
+                for tiles in self._tiles.values():
+                    for digest in [digest for digest, (file, _) in tiles.items() if file == data_file]:
+                        del tiles[digest]
+
+                total_size -= size
+                logger.debug(f"evicted {data_file} from tile store")
@@ -3,55 +3,171 @@ from __future__ import annotations
 import json
 import logging
 import os
-from typing import Any
+from collections.abc import Iterator
+from typing import Any, Optional, TextIO
 
+from .card import Card
 from .carddb import CardDB
 from .cards import Cards
 from .code import Code
+from .grid import Grid
 from .language import Language
-from .utils import CARD_BACK_URL, DECKS_DIR_NAME
+from .metrics import Metrics
+from .utils import GRID, CARD_BACK_URL, DECKS_DIR_NAME, tier_file_name
+
+
+def _contains_iterator(value: Any) -> bool:
+    if isinstance(value, Iterator):
+        return True
+    elif isinstance(value, dict):
+        return any(_contains_iterator(item) for item in value.values())
+    elif isinstance(value, (list, tuple)):
+        return any(_contains_iterator(item) for item in value)
+    else:
+        return False
+
+
+def _dumps(value: Any, indent: Optional[int], level: int) -> str:
+    text = json.dumps(value, indent=indent, separators=(",", ":") if indent is None else (",", ": "))
+    if indent is not None and level > 0:
+        # JSON strings never contain raw newlines
+        text = text.replace("\n", "\n" + " " * (indent * level))
+
+    return text
+
+
+def _iter_json(value: Any, indent: Optional[int], level: int = 0) -> Iterator[str]:
+    # like json.dumps, but emits chunks and encodes iterators as arrays
+    if not _contains_iterator(value):
+        yield _dumps(value, indent, level)
+        return
+
+    if isinstance(value, dict):
+        begin, end = "{", "}"
+        key_separator = ":" if indent is None else ": "
+        items = (
+            (json.dumps(str(key)) + key_separator, _iter_json(item, indent, level + 1))
+            for key, item in value.items()
+        )
+
+    elif isinstance(value, Iterator):
+        # items of iterators are encoded at once
+        begin, end = "[", "]"
+        items = (
+            ("", [_dumps(item, indent, level + 1)])
+            for item in value
+        )
+
+    else:
+        begin, end = "[", "]"
+        items = (
+            ("", _iter_json(item, indent, level + 1))
+            for item in value
+        )
+
+    if indent is None:
+        item_newline, end_newline = "", ""
+    else:
+        item_newline = "\n" + " " * (indent * (level + 1))
+        end_newline = "\n" + " " * (indent * level)
+
+    separator = begin
+    for prefix, chunks in items:
+        yield separator + item_newline + prefix
+        yield from chunks
+        separator = ","
+
+    if separator == begin:
+        # empty container
+        yield begin + end
+    else:
+        yield end_newline + end
 
 
 class TTSDeck(Cards):
-    def __init__(self, codes: list[Code], name: str, description: str, face_down: bool):
+    def __init__(self, codes: list[Code], name: str, description: str, face_down: bool,
+                 language: Optional[Language] = None):
         logger = logging.getLogger(__name__)
         super().__init__(name)
         self.__description = description
         self.__face_down = face_down
+        self.__language = language
+        # card code -> (face, index), overriding the cards' own
+        self.__layout: dict[Code, tuple[str, int]] = {}
+        self.__layout_faces: set[str] = set()
+        self.__face_url_prefix = ""
 
         # get cards from carddb
         carddb = CardDB()
 
-        # non-imported cards
-        codes_invalid = frozenset([
-            code
-            for code in codes
-            if code not in carddb
-        ])
+        # put existing cards into deck, collecting non-imported cards
+        codes_invalid = {}
+        for code in codes:
+            try:
+                self.append(carddb[code])
+            except KeyError:
+                codes_invalid[code] = None
 
-        # show errors and remove non-imported cards
+        # show errors for non-imported cards
         for code in codes_invalid:
             logger.error(f"Code '{code}' not in CardDB, ignoring!")
-            while code in codes:
-                codes.remove(code)
-
-        # put existing cards into deck
-        self.extend([
-            carddb[code]
-            for code in codes
-        ])
 
     @property
     def file_name(self) -> str:
         return f"{super().file_name}.json"
 
-    def get_tts_object(self, language: Language) -> dict[str, Any]:
-        carddb = CardDB()
+    @property
+    def language(self) -> Optional[Language]:
+        # language the deck was built for, if any
+        return self.__language
+
+    @property
+    def atlas_cards(self) -> Cards:
+        # unique cards, to put onto pages of their own
+        unique_cards = {
+            card.code: card
+            for card in self
+        }
+
+        return Cards(f"{self.name} {self.__description}", list(unique_cards.values()))
+
+    def use_layout(self, layout: dict[Code, tuple[str, int]], face_url_prefix: str = "") -> None:
+        # take cards from other pages, e.g. those of a Book of atlas_cards
+        self.__layout = layout
+        self.__layout_faces = set(face for face, _ in layout.values())
+        self.__face_url_prefix = face_url_prefix
+
+    def __placement(self, card: Card, language: Language) -> tuple[str, int]:
+        try:
+            return self.__layout[card.code]
+        except KeyError:
+            return card.face(language), card.index
+
+    def __face_url(self, face: str, tier: Optional[str]) -> str:
+        tier_face = tier_file_name(face, tier)
+
+        if self.__face_url_prefix and face in self.__layout_faces:
+            return f"{self.__face_url_prefix}{tier_face}"
+
+        return CardDB().get_face_url(tier_face)
+
+    def __face_grid(self, face: str, grid: Grid) -> Grid:
+        # pages of the layout are built in this run, others with the grid recorded in the CardDB
+        if face in self.__layout_faces:
+            return grid
+
+        return CardDB().get_face_grid(face)
+
+    def __tts_object(self, language: Language, grid: Grid, tier: Optional[str]) -> dict[str, Any]:
+        placements = [
+            self.__placement(card, language)
+            for card in self
+        ]
 
         # unique face urls used
         unique_faces = set([
-            card[language].face
-            for card in self
+            face
+            for face, _ in placements
         ])
 
         # lookup for indices of urls
@@ -63,11 +179,12 @@ class TTSDeck(Cards):
         # build the "CustomDeck" dictionary
         custom_deck = {
             str(i): {
-                "NumWidth": "10",
-                "NumHeight": "7",
-                "FaceURL": carddb.get_face_url(face),
+                "NumWidth": str(face_grid.x),
+                "NumHeight": str(face_grid.y),
+                "FaceURL": self.__face_url(face, tier),
                 "BackURL": CARD_BACK_URL,
             } for face, i in face_indices.items()
+            for face_grid in [self.__face_grid(face, grid)]
         }
 
         # values both in main deck and each contained card
@@ -87,27 +204,34 @@ class TTSDeck(Cards):
             "GridProjection": False,
         }
 
-        # cards contained in deck
-        contained_objects = [
+        if self.__face_down:
+            # flip the deck
+            common_dict["Transform"]["rotZ"] = 180.0
+
+        # extract the card ids
+        deck_ids = [
+            100 * face_indices[face] + index
+            for face, index in placements
+        ]
+
+        # cards contained in deck, created while writing
+        contained_objects = (
             {
-                "Nickname": card[language].name,
-                "Description": card[language].text,
-                "CardID": 100 * face_indices[card[language].face] + card.index,
+                "Nickname": content.name,
+                "Description": content.text,
+                "CardID": card_id,
 
                 "Name": "Card",
                 "Hands": True,
                 "SidewaysCard": False,
-            } | common_dict for card in self
-        ]
-
-        # extract the card ids
-        deck_ids = [
-            contained_object["CardID"]
-            for contained_object in contained_objects
-        ]
+                **common_dict,
+            }
+            for card, card_id in zip(self, deck_ids)
+            for content in [card[language]]
+        )
 
         # create the deck dictionary
-        deck_dict = {"ObjectStates": [
+        return {"ObjectStates": [
             {
                 "Nickname": self.name,
                 "Description": self.__description,
@@ -118,23 +242,35 @@ class TTSDeck(Cards):
                 "Name": "Deck",
                 "Hands": False,
                 "SidewaysCard": False,
-            } | common_dict
+                **common_dict,
+            }
         ]}
 
-        if self.__face_down:
-            # flip the deck
-            deck_dict["ObjectStates"][0]["Transform"]["rotZ"] = 180.0
+    def get_tts_object(self, language: Language, grid: Grid = GRID, tier: Optional[str] = None) -> dict[str, Any]:
+        deck_dict = self.__tts_object(language, grid, tier)
+        deck_object = deck_dict["ObjectStates"][0]
+        deck_object["ContainedObjects"] = list(deck_object["ContainedObjects"])
 
         return deck_dict
 
-    def get_json(self, language: Language) -> str:
-        return json.dumps(self.get_tts_object(language), indent=2)
+    def write(self, file: TextIO, language: Language, compact: bool = False,
+              grid: Grid = GRID, tier: Optional[str] = None) -> None:
+        # stream the deck, without holding the whole JSON document
+        with Metrics().stage("deck.write"):
+            file.writelines(_iter_json(self.__tts_object(language, grid, tier), None if compact else 2))
+
+        Metrics().add("deck.write", cards=len(self))
+
+    def get_json(self, language: Language, compact: bool = False,
+                 grid: Grid = GRID, tier: Optional[str] = None) -> str:
+        return "".join(_iter_json(self.__tts_object(language, grid, tier), None if compact else 2))
 
-    def save(self, language: Language) -> None:
+    def save(self, language: Language, compact: bool = False,
+             grid: Grid = GRID, tier: Optional[str] = None) -> None:
         # only save if the deck contains cards
         if self:
             if not os.path.exists(DECKS_DIR_NAME):
                 os.mkdir(DECKS_DIR_NAME)
 
             with open(os.path.join(DECKS_DIR_NAME, self.file_name), "w") as file:
-                file.write(self.get_json(language))
+                self.write(file, language, compact, grid, tier)
@@ -1,5 +1,9 @@
+import contextlib
 import itertools
-from typing import Iterator, Generator, Iterable
+import os
+import threading
+from os import PathLike
+from typing import IO, Iterator, Generator, Iterable, Optional
 
 from PIL import Image
 
@@ -10,8 +14,29 @@ GRID = Grid((10, 7))  # default in TTsim: 10 columns, 7 rows
 RESOLUTION = Grid((429, 600))  # default in TTsim: 480x670 pixels per card
 DECKS_DIR_NAME = "decks"  # name of decks directory
 IMAGES_DIR_NAME = "images"  # name of images directory
+CACHE_DIR_NAME = "cache"  # name of cache directory
+RESPONSES_DIR_NAME = "responses"  # name of API responses directory in cache
+TILES_DIR_NAME = "tiles"  # name of card tiles directory in cache
+
+# service URLs, can be overridden from the environment (e.g. to benchmark against local stand-ins)
 # card back URL (image by Aurik)
-CARD_BACK_URL = "http://cloud-3.steamusercontent.com/ugc/948455238665576576/85063172B8C340602E8D6C783A457122F53F7843/"
+CARD_BACK_URL = os.environ.get(
+    "FFTCGTOOL_CARD_BACK_URL",
+    "http://cloud-3.steamusercontent.com/ugc/948455238665576576/85063172B8C340602E8D6C783A457122F53F7843/",
+)
+# card face URL format, filled in with card code and language suffix
+CARD_FACE_URL = os.environ.get(
+    "FFTCGTOOL_CARD_FACE_URL",
+    "https://fftcg.cdn.sewest.net/images/cards/full/{}_{}.jpg",
+)
+SQUARE_API_URL = os.environ.get(
+    "FFTCGTOOL_SQUARE_API_URL",
+    "https://fftcg.square-enix-games.com/en/get-cards",
+)
+FFDECKS_API_URL = os.environ.get(
+    "FFTCGTOOL_FFDECKS_API_URL",
+    "https://ffdecks.com/api/deck",
+)
 
 
 # functions
@@ -52,12 +77,58 @@ def chunks(chunk_size: int, whole: Iterable) -> Generator[Iterator, None, None]:
         yield itertools.chain((first_el,), chunk)
 
 
-def grid_paste(page: Image.Image, index: int, card: Image.Image) -> None:
+def grid_paste(page: Image.Image, index: int, card: Image.Image, grid: Grid = GRID) -> None:
     w, h = card.size
-    position = (index % GRID.x) * w, (index // GRID.x) * h
+    position = (index % grid.x) * w, (index // grid.x) * h
     page.paste(card, position)
 
 
+def tier_file_name(file_name: str, tier: Optional[str]) -> str:
+    # page file of an output tier, e.g. "opus_1_en_0_preview.jpg"
+    if not tier:
+        return file_name
+
+    stem, extension = os.path.splitext(file_name)
+    return f"{stem}_{tier}{extension}"
+
+
+@contextlib.contextmanager
+def atomic_write(path: str | PathLike[str], mode: str = "w", durable: bool = False, **kwargs) -> Iterator[IO]:
+    # write-then-rename, so readers never see partial files
+    tmp_path = f"{os.fspath(path)}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    try:
+        with open(tmp_path, mode, **kwargs) as file:
+            yield file
+
+            if durable:
+                # contents on disk before the rename, so a power loss never leaves an empty file
+                file.flush()
+                os.fsync(file.fileno())
+
+        os.replace(tmp_path, path)
+
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+    if not durable:
+        return
+
+    try:
+        # persist the rename itself
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        # directories can't be opened on Windows
+        return
+
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
 def int_default(integer: str, default: int) -> int:
     try:
         return int(integer)